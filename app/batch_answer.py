@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+"""
+batch_answer.py
+
+JSONL 질문 파일을 운영 챗봇과 동일한 파이프라인으로 일괄 답변하는 오프라인 배치 CLI
+
+주요 기능:
+1. 입력 JSONL을 스트리밍으로 읽어 제한된 동시성으로 처리 (파일 전체를 메모리에 올리지 않음)
+2. 질문 시작 속도 제한(--rpm) + bedrock_client 스케줄러의 모델별 RPM/TPM 쿼터 적용
+3. 결과(답변, 재정렬 문서, 단계별 소요 시간, 토큰 사용량)를 완료 순서대로 즉시 기록
+4. 출력 파일이 체크포인트 - 중단 후 같은 명령으로 재실행하면 완료된 id는 건너뜀
+5. --stub 또는 BEDROCK_TRAFFIC_MODE=replay로 AWS 호출 없이 로컬 실행
+
+입력 형식 (한 줄에 질문 하나, system/kb_ids는 선택):
+    {"id": "q-001", "question": "...", "system": "...", "kb_ids": ["KB1", "KB2"]}
+
+사용 예:
+    python batch_answer.py questions.jsonl -o answers.jsonl --concurrency 8 --rpm 120
+    python batch_answer.py questions.jsonl --stub
+
+아키텍처:
+- 질문당 query_kbs → compose_prompt → invoke_nova_pro (streamlit_ui의 첫 질문 처리와 동일)
+- 질문마다 별도 session_id를 사용하여 스케줄러가 질문 간 라운드로빈으로 처리
+- 결과 기록은 메인 스레드에서만 수행 (작업 스레드는 결과 dict만 반환)
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from bedrock_client import (
+    DEFAULT_SYSTEM_PROMPT,
+    KB_FANOUT_TIMEOUT_SEC,
+    TokenBucket,
+    compose_prompt,
+    get_kb_ids_from_ssm,
+    get_scheduler,
+    invoke_nova_pro,
+    mask_possible_pii,
+    parse_kb_ids,
+    query_kbs,
+)
+
+# =============================================================================
+# 설정 상수
+# =============================================================================
+
+# 완료로 간주하는 상태 (재실행 시 건너뜀) - busy/partial/error는 재실행 시 다시 처리
+DONE_STATUSES = {"ok", "blocked", "no_hit", "invalid"}
+
+# 배치는 대화형 UI보다 오래 기다려도 되므로 스케줄러 대기 한도를 늘림
+DEFAULT_MAX_WAIT_SEC = 120.0
+
+
+# =============================================================================
+# 입력 / 체크포인트
+# =============================================================================
+
+def iter_questions(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    입력 JSONL을 한 줄씩 읽어 질문 레코드를 생성합니다.
+
+    Note:
+        - id가 없으면 줄 번호로 대체 (line-N)
+        - JSON 파싱 실패/질문 누락 줄은 invalid 레코드로 전달하여 결과 파일에 남김
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield {"id": f"line-{lineno}", "error": f"JSON 파싱 실패: {e}"}
+                continue
+            if not isinstance(record, dict):
+                yield {"id": f"line-{lineno}", "error": "JSON 객체가 아닙니다."}
+                continue
+            record["id"] = str(record.get("id") or f"line-{lineno}")
+            if not str(record.get("question") or "").strip():
+                record["error"] = "question 필드가 비어 있습니다."
+            yield record
+
+
+def load_checkpoint(path: str) -> Set[str]:
+    """
+    기존 출력 파일에서 완료된 id 집합을 읽습니다.
+
+    Note:
+        - 같은 id가 여러 번 기록된 경우 마지막 줄이 유효 (재시도 결과)
+        - 중단으로 잘린 마지막 줄은 무시
+    """
+    statuses: Dict[str, str] = {}
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(row, dict) and "id" in row:
+                statuses[str(row["id"])] = row.get("status", "")
+    return {qid for qid, status in statuses.items() if status in DONE_STATUSES}
+
+
+def open_output(path: str):
+    """출력 파일을 추가 모드로 열기 (잘린 마지막 줄 뒤에 이어 쓰지 않도록 줄바꿈 보정)"""
+    needs_newline = False
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    out = open(path, "a", encoding="utf-8")
+    if needs_newline:
+        out.write("\n")
+    return out
+
+
+# =============================================================================
+# 질문 처리
+# =============================================================================
+
+def answer_question(record: Dict[str, Any], *, kb_ids: List[str], system_prompt: str, num_docs: int,
+                    max_tokens: int, temperature: float, top_p: float,
+                    kb_timeout: float = KB_FANOUT_TIMEOUT_SEC) -> Dict[str, Any]:
+    """
+    질문 1건을 운영 파이프라인으로 처리하여 결과 행을 만듭니다.
+
+    Returns:
+        Dict[str, Any]: {'id', 'status', 'question', 'answer', 'docs', 'timings_ms', 'usage', 'per_kb', 'error'}
+        - status: ok | partial(일부 KB 실패) | blocked(Guardrail) | no_hit(KB 미히트) | busy(혼잡 거절) | error | invalid
+
+    Note:
+        - UI와 동일하게 KB 미히트면 모델을 호출하지 않음
+        - 예외는 error 상태로 기록하여 배치 전체가 중단되지 않도록 처리
+        - 일부 KB가 타임아웃/실패한 답변은 partial로 기록 (재실행 시 다시 처리)
+    """
+    qid = record["id"]
+    question = str(record.get("question") or "")
+    row: Dict[str, Any] = {
+        "id": qid, "status": "invalid", "question": question, "answer": "", "docs": [],
+        "timings_ms": {}, "usage": {}, "per_kb": {}, "error": record.get("error"),
+    }
+    if row["error"]:
+        return row
+
+    session_id = f"batch-{qid}"
+    timings = row["timings_ms"]
+    started = time.perf_counter()
+    try:
+        # 1. KB 검색 + 병합 + Rerank (질문별 KB 지정 허용)
+        requested = record.get("kb_ids") or ""
+        if isinstance(requested, list):
+            requested = ",".join(str(kb_id) for kb_id in requested)
+        targets = parse_kb_ids(requested) or kb_ids
+        context, reranked, meta = query_kbs(question, targets, num_docs, session_id=session_id, timeout=kb_timeout)
+        timings["retrieve"] = round((time.perf_counter() - started) * 1000, 1)
+        if "rerank_ms" in meta:
+            timings["rerank"] = meta["rerank_ms"]
+        row["per_kb"] = meta.get("per_kb", {})
+        row["docs"] = [chunk._asdict() for chunk in reranked]
+        failed_kbs = [kb_id for kb_id, info in row["per_kb"].items() if info.get("error")]
+        kb_errors = "; ".join(f"{kb_id}: {row['per_kb'][kb_id]['error']}" for kb_id in failed_kbs)
+
+        if meta.get("busy"):
+            row.update(status="busy", error=meta.get("error"))
+            return row
+        if meta.get("retrieved", 0) == 0:
+            # 실패한 KB가 있으면 미히트로 확정하지 않음 (재실행 시 다시 처리)
+            if meta.get("error") or failed_kbs:
+                row.update(status="error", error=meta.get("error") or kb_errors)
+            else:
+                row["status"] = "no_hit"
+            return row
+
+        # 2. 프롬프트 구성 (UI 첫 질문과 동일한 메시지 구성)
+        final_system = str(record.get("system") or "").strip() or system_prompt
+        full_prompt = compose_prompt(final_system, context or "", question)
+        messages = [{"role": "user", "content": question}, {"role": "user", "content": full_prompt}]
+
+        # 3. Nova Pro 호출
+        generate_started = time.perf_counter()
+        nova_meta: Dict[str, Any] = {}
+        reply, gr_blocked = invoke_nova_pro(
+            messages, max_tokens=max_tokens, temperature=temperature, top_p=top_p,
+            session_id=session_id, meta=nova_meta,
+        )
+        timings["generate"] = round((time.perf_counter() - generate_started) * 1000, 1)
+        row["usage"] = nova_meta.get("usage", {})
+        row["answer"] = mask_possible_pii(reply)
+
+        if nova_meta.get("busy"):
+            row["status"] = "busy"
+        elif nova_meta.get("error"):
+            row.update(status="error", error=nova_meta["error"])
+        elif gr_blocked:
+            row["status"] = "blocked"
+        else:
+            row["status"] = "partial" if failed_kbs else "ok"
+            if failed_kbs:
+                row["error"] = kb_errors
+        return row
+
+    except Exception as e:
+        logging.error(f"[BATCH] {qid} 처리 실패: {e}")
+        row.update(status="error", error=str(e))
+        return row
+
+    finally:
+        timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+
+
+# =============================================================================
+# 배치 실행
+# =============================================================================
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round((len(ordered) - 1) * q / 100.0)))]
+
+
+def run_batch(input_path: str, output_path: str, *, kb_ids: List[str], system_prompt: str, concurrency: int,
+              rpm: float, num_docs: int, max_tokens: int, temperature: float, top_p: float,
+              kb_timeout: float = KB_FANOUT_TIMEOUT_SEC, limit: int = 0) -> Dict[str, Any]:
+    """
+    입력 파일의 질문을 제한된 동시성으로 처리하고 결과를 출력 파일에 추가합니다.
+
+    Args:
+        input_path: 질문 JSONL 경로
+        output_path: 결과 JSONL 경로 (체크포인트 겸용)
+        kb_ids: 기본 검색 대상 KB ID 리스트 (질문의 kb_ids가 우선)
+        system_prompt: 기본 시스템 프롬프트 (질문의 system이 우선)
+        concurrency: 동시에 처리할 질문 수
+        rpm: 분당 질문 시작 수 한도 (0이면 제한 없음)
+        kb_timeout: 다중 KB 검색 시 KB별 타임아웃(초)
+        limit: 이번 실행에서 처리할 최대 질문 수 (0이면 전체)
+
+    Returns:
+        Dict[str, Any]: 상태별 건수, 건너뛴 수, 처리량, 단계별 지연 백분위수, 토큰 합계
+
+    Note:
+        - 실행 중인 질문 수가 concurrency에 도달하면 입력 읽기를 멈춤 (메모리 사용량 일정)
+        - 결과는 완료 순서대로 기록하고 줄마다 flush (중단 시 완료분 보존)
+    """
+    completed = load_checkpoint(output_path)
+    bucket = TokenBucket(rpm) if rpm > 0 else None
+    options = dict(kb_ids=kb_ids, system_prompt=system_prompt, num_docs=num_docs,
+                   max_tokens=max_tokens, temperature=temperature, top_p=top_p, kb_timeout=kb_timeout)
+
+    counts: Dict[str, int] = {}
+    timings: Dict[str, List[float]] = {}
+    usage: Dict[str, int] = {}
+    skipped = submitted = 0
+    started = time.perf_counter()
+
+    def write(out, futures) -> None:
+        for fut in futures:
+            row = fut.result()
+            out.write(json.dumps(row, ensure_ascii=False) + "\n")
+            out.flush()
+            counts[row["status"]] = counts.get(row["status"], 0) + 1
+            for stage, ms in row["timings_ms"].items():
+                timings.setdefault(stage, []).append(ms)
+            for key, value in row["usage"].items():
+                if isinstance(value, int):
+                    usage[key] = usage.get(key, 0) + value
+            if row["status"] not in DONE_STATUSES:
+                logging.warning(f"[BATCH] {row['id']} {row['status']}: {row['error']}")
+
+    with open_output(output_path) as out, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending: Set[Any] = set()
+        try:
+            for record in iter_questions(input_path):
+                if record["id"] in completed:
+                    skipped += 1
+                    continue
+                if limit and submitted >= limit:
+                    break
+
+                # 동시 실행 한도 도달 시 하나 이상 완료될 때까지 대기
+                if len(pending) >= concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    write(out, done)
+
+                # 질문 시작 속도 제한
+                if bucket is not None:
+                    while True:
+                        bucket.refill(time.monotonic(), 1.0)
+                        delay = bucket.wait_time(1, 1.0)
+                        if delay <= 0:
+                            break
+                        time.sleep(delay)
+                    bucket.take(1)
+
+                completed.add(record["id"])  # 입력 파일 내 중복 id 방지
+                pending.add(pool.submit(answer_question, record, **options))
+                submitted += 1
+
+            done, _ = wait(pending)
+            write(out, done)
+        except KeyboardInterrupt:
+            # 완료된 결과만 기록하고 대기 중인 작업은 취소 (재실행 시 이어서 처리)
+            write(out, [fut for fut in pending if fut.done() and not fut.cancelled()])
+            pool.shutdown(wait=False, cancel_futures=True)
+            logging.warning("[BATCH] 중단됨 - 같은 명령으로 재실행하면 완료된 질문은 건너뜁니다.")
+            raise
+
+    elapsed = time.perf_counter() - started
+    processed = sum(counts.values())
+    return {
+        "processed": processed,
+        "skipped": skipped,
+        "statuses": counts,
+        "elapsed_sec": round(elapsed, 1),
+        "questions_per_min": round(processed * 60 / elapsed, 1) if elapsed > 0 else 0.0,
+        "timings_ms": {
+            stage: {
+                "p50": round(_percentile(values, 50), 1),
+                "p95": round(_percentile(values, 95), 1),
+                "max": round(max(values), 1),
+            }
+            for stage, values in timings.items()
+        },
+        "usage": usage,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="JSONL 질문 일괄 답변 (운영 파이프라인 재사용, 재개 가능)")
+    parser.add_argument("input", help="질문 JSONL 파일 ({\"id\", \"question\", \"system\"?, \"kb_ids\"?})")
+    parser.add_argument("-o", "--output", help="결과 JSONL 파일 (기본값: <입력>.answers.jsonl, 체크포인트 겸용)")
+    parser.add_argument("--kb-ids", default="", help="쉼표로 구분한 KB ID (기본값: SSM /chatbot/bedrock/kb_ids)")
+    parser.add_argument("--system-file", help="기본 시스템 프롬프트 파일 (기본값: UI 기본 프롬프트)")
+    parser.add_argument("--concurrency", type=int, default=8, help="동시 처리 질문 수")
+    parser.add_argument("--rpm", type=float, default=0, help="분당 질문 시작 수 한도 (0이면 스케줄러 쿼터만 적용)")
+    parser.add_argument("--max-wait", type=float, default=DEFAULT_MAX_WAIT_SEC,
+                        help="스케줄러 대기 한도(초) - 초과 시 busy로 기록 후 재실행 때 재시도")
+    parser.add_argument("--kb-timeout", type=float,
+                        help="다중 KB 검색 시 KB별 타임아웃(초, 기본값: --max-wait) - 스케줄러 대기도 이 시간으로 제한")
+    parser.add_argument("--num-docs", type=int, default=3, help="KB별 검색 문서 수")
+    parser.add_argument("--max-tokens", type=int, default=2048)
+    parser.add_argument("--temperature", type=float, default=0.6)
+    parser.add_argument("--top-p", type=float, default=0.9)
+    parser.add_argument("--limit", type=int, default=0, help="이번 실행에서 처리할 최대 질문 수 (0이면 전체)")
+    parser.add_argument("--stub", action="store_true", help="AWS 호출 없이 스텁 클라이언트로 실행")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    # 클라이언트는 첫 호출 시 생성되므로 import 이후에 설정해도 적용됨
+    if args.stub:
+        os.environ["BEDROCK_TRAFFIC_MODE"] = "stub"
+
+    kb_ids = parse_kb_ids(args.kb_ids)
+    if not kb_ids:
+        kb_ids = ["STUBKB"] if args.stub else get_kb_ids_from_ssm()
+    if not kb_ids:
+        logging.warning("[BATCH] KB ID가 없습니다. 질문별 kb_ids가 없는 질문은 오류로 기록됩니다.")
+
+    system_prompt = DEFAULT_SYSTEM_PROMPT
+    if args.system_file:
+        with open(args.system_file, "r", encoding="utf-8") as f:
+            system_prompt = f.read().strip() or DEFAULT_SYSTEM_PROMPT
+
+    # 배치 질문들이 대기열 한도에 걸려 거절되지 않도록 스케줄러 한도 조정
+    concurrency = max(1, args.concurrency)
+    scheduler = get_scheduler()
+    scheduler.max_wait = max(scheduler.max_wait, args.max_wait)
+    scheduler.queue_limit = max(scheduler.queue_limit, concurrency * max(1, len(kb_ids)))
+
+    output = args.output or f"{os.path.splitext(args.input)[0]}.answers.jsonl"
+    try:
+        report = run_batch(
+            args.input, output, kb_ids=kb_ids, system_prompt=system_prompt, concurrency=concurrency,
+            rpm=args.rpm, num_docs=args.num_docs, max_tokens=args.max_tokens,
+            temperature=args.temperature, top_p=args.top_p, limit=args.limit,
+            kb_timeout=args.kb_timeout if args.kb_timeout is not None else max(args.max_wait, KB_FANOUT_TIMEOUT_SEC),
+        )
+    except KeyboardInterrupt:
+        return 130
+
+    report["output"] = output
+    json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write("\n")
+
+    # busy/error가 남아 있으면 재실행 필요 (종료코드 1)
+    return 1 if any(status not in DONE_STATUSES for status in report["statuses"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -20,11 +20,18 @@ bedrock_client.py
 
 import boto3
 import json
+import os
+import random
 import re
 import logging
-from functools import lru_cache
-from typing import Optional, List, Tuple, Dict, Any
-from botocore.exceptions import ClientError
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from functools import lru_cache, partial
+from typing import Optional, List, Tuple, Dict, Any, Deque, NamedTuple
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError
 
 # =============================================================================
 # 설정 상수
@@ -42,12 +49,103 @@ RERANK_MODEL_ARN = "arn:aws:bedrock:ap-northeast-1::foundation-model/amazon.rera
 
 # 사용자 메시지
 BLOCK_NOTICE = "개인정보/부적절한 표현에 대한 요청은 답변 드릴 수 없습니다."
+BUSY_NOTICE = "현재 요청이 많아 답변이 지연되고 있습니다. 잠시 후 다시 시도해 주세요."
+
+# 기본 시스템 프롬프트 (AWS 금융 클라우드 전문가 역할)
+DEFAULT_SYSTEM_PROMPT = (
+    "당신은 AWS 소개 및 제안, 금융분야 클라우드컴퓨팅서비스 전문가입니다. "
+    "질문자의 배경지식이 완벽하지 않을 수 있음을 고려해, 쉬운 용어로 단계적으로 설명하되, "
+    "필요한 경우 구체 예시와 권장 아키텍처, 고 링크(서비스명/프로그램명만)를 제시하세요. "
+    "모호할 때는 필요한 사실을 먼저 확인하는 질문을 1~2개 던진 뒤 답하세요. "
+    "허용된 지식베이스 문서에 근거해 답하며, 추정이 필요할 때는 '추정'임을 명확히 표기하세요."
+)
+
+# 호출 스케줄러 레인 (모델@리전 단위로 쿼터 관리)
+CONVERSE_LANE = f"{NOVA_PRO_MODEL_ID}@{BEDROCK_RUNTIME_REGION}"
+RETRIEVE_LANE = f"kb-retrieve@{BEDROCK_KB_REGION}"
+RERANK_LANE = f"amazon.rerank-v1:0@{BEDROCK_RERANK_REGION}"
+EMBED_LANE = f"amazon.titan-embed-text-v2:0@{BEDROCK_RUNTIME_REGION}"
+GUARDRAIL_LANE = f"apply-guardrail@{BEDROCK_RUNTIME_REGION}"
+
+# 레인별 쿼터 (RPM, TPM) - 계정 Service Quotas에 맞게 환경변수로 재정의
+# TPM이 0이면 요청 수(RPM)만 제한
+BEDROCK_QUOTAS = {
+    CONVERSE_LANE: (int(os.getenv("BEDROCK_CONVERSE_RPM", "100")), int(os.getenv("BEDROCK_CONVERSE_TPM", "400000"))),
+    RETRIEVE_LANE: (int(os.getenv("BEDROCK_RETRIEVE_RPM", "600")), 0),
+    RERANK_LANE: (int(os.getenv("BEDROCK_RERANK_RPM", "300")), 0),
+    EMBED_LANE: (int(os.getenv("BEDROCK_EMBED_RPM", "2000")), int(os.getenv("BEDROCK_EMBED_TPM", "300000"))),
+    GUARDRAIL_LANE: (int(os.getenv("BEDROCK_GUARDRAIL_RPM", "600")), 0),
+}
+
+# Rerank 전송 문서당 최대 글자 수 (0이면 공백 압축만 적용, 리전 간 페이로드 절감용)
+RERANK_MAX_CHARS = int(os.getenv("RERANK_MAX_CHARS", "0"))
+
+# 다중 KB 검색 설정
+# - 타임아웃을 넘긴 KB는 제외하고 나머지 결과로 진행
+# - 병합 방식: rrf (Reciprocal Rank Fusion) | score (KB별 min-max 정규화 점수)
+KB_FANOUT_TIMEOUT_SEC = float(os.getenv("KB_FANOUT_TIMEOUT_SEC", "5"))
+KB_FANOUT_MAX_WORKERS = int(os.getenv("KB_FANOUT_MAX_WORKERS", "16"))
+KB_FUSION_METHOD = os.getenv("KB_FUSION_METHOD", "rrf")
+KB_FUSION_MAX_CANDIDATES = int(os.getenv("KB_FUSION_MAX_CANDIDATES", "20"))  # Rerank로 보낼 최대 후보 수
+RRF_K = 60
+
+# 대기열 설정 (레인별 최대 대기 요청 수, 최대 대기 시간)
+SCHEDULER_QUEUE_LIMIT = int(os.getenv("BEDROCK_QUEUE_LIMIT", "32"))
+SCHEDULER_MAX_WAIT_SEC = float(os.getenv("BEDROCK_QUEUE_MAX_WAIT_SEC", "20"))
+
+# 유입 제어를 생략하는 트래픽 모드 (AWS를 호출하지 않으므로 토큰 버킷 대기가 재생 지연을 왜곡)
+OFFLINE_TRAFFIC_MODES = {"replay", "stub"}
+
+# 토큰 추정 (한국어 비중이 높아 보수적으로 글자 2개당 1토큰)
+CHARS_PER_TOKEN = 2.0
+
+# Guardrail SSM 조회 결과 캐시 유지 시간(초) - 호출마다 SSM 3회 조회 방지
+GUARDRAIL_CACHE_TTL_SEC = float(os.getenv("GUARDRAIL_CACHE_TTL_SEC", "300"))
+# 조회 실패(None)는 짧게만 캐시 - SSM 일시 장애로 Guardrail이 오래 꺼지지 않도록
+GUARDRAIL_FAILURE_TTL_SEC = 5.0
+
+# 스로틀링으로 판단하는 오류 코드
+THROTTLE_ERROR_CODES = {"ThrottlingException", "TooManyRequestsException", "ServiceQuotaExceededException"}
+
+# 일시적 오류로 판단하는 오류 코드 (5xx / 모델 준비 중) - 지수 백오프로 제한 재시도
+TRANSIENT_ERROR_CODES = {
+    "InternalServerException", "InternalFailure", "ServiceUnavailableException",
+    "ServiceUnavailable", "ModelNotReadyException", "ModelTimeoutException",
+}
+TRANSIENT_MAX_RETRIES = int(os.getenv("BEDROCK_TRANSIENT_RETRIES", "2"))
+TRANSIENT_BACKOFF_SEC = 0.5
+
+# Bedrock 클라이언트 설정 - 재시도(스로틀링/일시적 오류)는 _scheduled_call이 담당하므로 botocore 자동 재시도 비활성화
+BEDROCK_CLIENT_CONFIG = Config(retries={"mode": "standard", "total_max_attempts": 1})
 
 
 # =============================================================================
 # AWS 클라이언트 팩토리 함수들
 # =============================================================================
 
+def _create_client(service: str, region: str, config: Optional[Config] = None):
+    """
+    boto3 클라이언트 생성 (트래픽 기록/재생 모드 연동)
+    
+    Args:
+        service: boto3 서비스 이름
+        region: AWS 리전
+        config: botocore 클라이언트 설정 (재시도 정책 등)
+        
+    Returns:
+        boto3.client 또는 기록/재생 프록시 클라이언트
+        
+    Note:
+        - BEDROCK_TRAFFIC_MODE 환경변수가 있을 때만 bedrock_replay 사용
+        - bedrock_replay가 이 모듈을 import하므로 지연 import (순환 참조 방지)
+    """
+    factory = partial(boto3.client, config=config) if config else boto3.client
+    if os.getenv("BEDROCK_TRAFFIC_MODE"):
+        from bedrock_replay import traffic_client
+        return traffic_client(service, region, factory)
+    return factory(service, region_name=region)
+
+
 @lru_cache(maxsize=1)
 def get_bedrock_runtime():
     """
@@ -60,7 +158,7 @@ def get_bedrock_runtime():
         - LRU 캐시로 클라이언트 재사용 (성능 최적화)
         - Nova Pro 모델과 Guardrail은 us-east-1에서만 사용 가능
     """
-    return boto3.client("bedrock-runtime", region_name=BEDROCK_RUNTIME_REGION)
+    return _create_client("bedrock-runtime", BEDROCK_RUNTIME_REGION, BEDROCK_CLIENT_CONFIG)
 
 
 @lru_cache(maxsize=1)
@@ -75,7 +173,7 @@ def get_bedrock_kb():
         - Knowledge Base는 데이터 지역성을 위해 ap-northeast-2 사용
         - 벡터 검색 및 문서 검색 기능 제공
     """
-    return boto3.client("bedrock-agent-runtime", region_name=BEDROCK_KB_REGION)
+    return _create_client("bedrock-agent-runtime", BEDROCK_KB_REGION, BEDROCK_CLIENT_CONFIG)
 
 
 @lru_cache(maxsize=1)
@@ -90,7 +188,7 @@ def get_bedrock_rerank():
         - Rerank 서비스는 ap-northeast-1에서 제공
         - 검색된 문서들의 관련성 점수를 재계산하여 순서 최적화
     """
-    return boto3.client("bedrock-agent-runtime", region_name=BEDROCK_RERANK_REGION)
+    return _create_client("bedrock-agent-runtime", BEDROCK_RERANK_REGION, BEDROCK_CLIENT_CONFIG)
 
 
 @lru_cache(maxsize=8)
@@ -108,7 +206,279 @@ def get_ssm(region: str = SSM_REGION):
         - 설정값들(KB ID, Guardrail 정보)을 중앙 관리
         - 최대 8개 리전별 클라이언트 캐시 지원
     """
-    return boto3.client("ssm", region_name=region)
+    return _create_client("ssm", region)
+
+
+# =============================================================================
+# 호출 스케줄링 (쿼터 기반 유입 제어)
+# =============================================================================
+
+class BedrockBusyError(Exception):
+    """대기열이 가득 찼거나 대기 시간 내에 쿼터를 확보하지 못해 요청을 거절한 경우"""
+
+
+class TokenBucket:
+    """
+    분당 한도 기반 토큰 버킷
+    
+    Note:
+        - 버스트 허용량은 10초 분량 (분당 한도 / 6)
+        - 한 번에 요청하는 양이 버스트 허용량보다 크면 허용량만큼만 차감
+        - 실제 사용량이 추정치보다 크면 잔량이 음수가 되어 다음 요청이 대기
+    """
+    
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, per_minute / 6.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+    
+    def refill(self, now: float, factor: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate * factor)
+        self.updated = now
+    
+    def wait_time(self, amount: float, factor: float) -> float:
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / max(self.rate * factor, 1e-9)
+    
+    def take(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+    
+    def adjust(self, delta: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + delta)
+
+
+class _Lane:
+    """
+    모델@리전 단위 스케줄링 레인
+    
+    Note:
+        - 세션별 대기열을 OrderedDict 순서로 라운드로빈 → 한 세션이 레인을 독점하지 않음
+        - rate_factor: 스로틀링 시 감소, 성공 시 점진 회복 (AIMD)
+    """
+    
+    def __init__(self, rpm: int, tpm: int):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.rate_factor = 1.0
+        self.waiting: "OrderedDict[str, Deque[object]]" = OrderedDict()
+        self.size = 0
+    
+    def head(self) -> Optional[object]:
+        for tickets in self.waiting.values():
+            return tickets[0]
+        return None
+    
+    def wait_time(self, tokens: int) -> float:
+        now = time.monotonic()
+        self.requests.refill(now, self.rate_factor)
+        wait = self.requests.wait_time(1, self.rate_factor)
+        if self.tokens is not None:
+            self.tokens.refill(now, self.rate_factor)
+            wait = max(wait, self.tokens.wait_time(tokens, self.rate_factor))
+        return wait
+    
+    def take(self, tokens: int) -> None:
+        self.requests.take(1)
+        if self.tokens is not None:
+            self.tokens.take(tokens)
+    
+    def remove(self, session_id: str, ticket: object) -> None:
+        tickets = self.waiting.get(session_id)
+        if tickets is None or ticket not in tickets:
+            return
+        tickets.remove(ticket)
+        self.size -= 1
+        if tickets:
+            self.waiting.move_to_end(session_id)  # 다음 차례는 다른 세션
+        else:
+            del self.waiting[session_id]
+
+
+class BedrockScheduler:
+    """
+    프로세스 전역 Bedrock 호출 스케줄러
+    
+    처리 과정:
+        1. 레인 대기열이 가득 차면 즉시 BedrockBusyError (부하 차단)
+        2. 세션 라운드로빈 순서의 선두 요청만 버킷에서 RPM/TPM 차감 후 통과
+        3. 최대 대기 시간 내에 통과하지 못하면 BedrockBusyError
+        4. ThrottlingException 발생 시 레인 속도를 절반으로, 성공 시 5%씩 회복
+        
+    Note:
+        - Streamlit 세션은 같은 프로세스의 스레드이므로 Condition 하나로 조정
+        - 쿼터가 정의되지 않은 레인은 제한 없이 통과
+    """
+    
+    MIN_RATE_FACTOR = 0.1
+    
+    def __init__(self, quotas: Dict[str, Tuple[int, int]], queue_limit: int, max_wait: float):
+        self._cond = threading.Condition()
+        self._lanes = {name: _Lane(rpm, tpm) for name, (rpm, tpm) in quotas.items()}
+        self.queue_limit = queue_limit
+        self.max_wait = max_wait
+    
+    def acquire(self, lane_name: str, tokens: int, session_id: str, deadline: Optional[float] = None) -> None:
+        """
+        레인 쿼터를 확보할 때까지 대기합니다.
+        
+        Args:
+            deadline: 호출자의 절대 마감 시각(time.monotonic 기준, 선택) - max_wait보다 짧으면 우선 적용
+        """
+        lane = self._lanes.get(lane_name)
+        if lane is None:
+            return
+        
+        with self._cond:
+            if lane.size >= self.queue_limit:
+                logging.warning(f"[SCHED] 대기열 초과로 요청 거절: {lane_name} (queue={lane.size})")
+                raise BedrockBusyError(lane_name)
+            
+            ticket = object()
+            lane.waiting.setdefault(session_id, deque()).append(ticket)
+            lane.size += 1
+            deadline = min(time.monotonic() + self.max_wait, deadline if deadline is not None else float("inf"))
+            
+            try:
+                while True:
+                    remaining = deadline - time.monotonic()
+                    wait = remaining
+                    if lane.head() is ticket:
+                        wait = lane.wait_time(tokens)
+                        if wait <= 0:
+                            lane.take(tokens)
+                            return
+                    if remaining <= 0 or wait > remaining:
+                        logging.warning(f"[SCHED] 대기 시간 초과로 요청 거절: {lane_name}")
+                        raise BedrockBusyError(lane_name)
+                    self._cond.wait(wait)
+            finally:
+                lane.remove(session_id, ticket)
+                self._cond.notify_all()
+    
+    def on_throttle(self, lane_name: str) -> None:
+        lane = self._lanes.get(lane_name)
+        if lane is None:
+            return
+        with self._cond:
+            lane.rate_factor = max(self.MIN_RATE_FACTOR, lane.rate_factor * 0.5)
+            logging.warning(f"[SCHED] 스로틀링 감지: {lane_name} rate_factor={lane.rate_factor:.2f}")
+    
+    def on_success(self, lane_name: str, estimated: int = 0, actual: Optional[int] = None) -> None:
+        lane = self._lanes.get(lane_name)
+        if lane is None:
+            return
+        with self._cond:
+            lane.rate_factor = min(1.0, lane.rate_factor + 0.05)
+            # 추정 토큰과 실제 사용량 차이 보정
+            if lane.tokens is not None and actual is not None:
+                lane.tokens.adjust(estimated - actual)
+            self._cond.notify_all()
+    
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """레인별 대기 수 / 속도 계수 (모니터링용)"""
+        with self._cond:
+            return {
+                name: {"queued": lane.size, "rate_factor": round(lane.rate_factor, 2)}
+                for name, lane in self._lanes.items()
+            }
+
+
+@lru_cache(maxsize=1)
+def get_scheduler() -> BedrockScheduler:
+    """
+    프로세스 전역 스케줄러 (모든 Streamlit 세션이 공유)
+    
+    Returns:
+        BedrockScheduler: BEDROCK_QUOTAS 기반 스케줄러
+    """
+    return BedrockScheduler(BEDROCK_QUOTAS, SCHEDULER_QUEUE_LIMIT, SCHEDULER_MAX_WAIT_SEC)
+
+
+class _NoAdmission:
+    """재생/스텁 모드용 스케줄러 - 쿼터 대기 없이 즉시 통과"""
+
+    def acquire(self, lane_name: str, tokens: int, session_id: str, deadline: Optional[float] = None) -> None:
+        pass
+
+    def on_throttle(self, lane_name: str) -> None:
+        pass
+
+    def on_success(self, lane_name: str, estimated: int = 0, actual: Optional[int] = None) -> None:
+        pass
+
+
+def _admission_scheduler():
+    """현재 트래픽 모드에 맞는 스케줄러 (replay/stub이면 유입 제어 생략)"""
+    if os.getenv("BEDROCK_TRAFFIC_MODE", "").strip().lower() in OFFLINE_TRAFFIC_MODES:
+        return _NoAdmission()
+    return get_scheduler()
+
+
+def estimate_tokens(text: str) -> int:
+    """텍스트 길이 기반 토큰 수 추정"""
+    return int(len(text or "") / CHARS_PER_TOKEN) + 1
+
+
+def _scheduled_call(lane: str, session_id: str, call, *, tokens: int = 0, usage_tokens=None,
+                    deadline: Optional[float] = None, **kwargs):
+    """
+    스케줄러를 거쳐 Bedrock API를 호출합니다.
+    
+    Args:
+        lane: 스케줄러 레인 이름
+        session_id: 공정 대기열용 세션 식별자
+        call: 호출할 클라이언트 메서드
+        tokens: 추정 입력+출력 토큰 수 (TPM 레인)
+        usage_tokens: 응답에서 실제 사용 토큰 수를 구하는 함수 (선택)
+        deadline: 절대 마감 시각(time.monotonic 기준, 선택) - 스케줄러 대기를 이 시각까지로 제한
+        **kwargs: API 파라미터
+        
+    Note:
+        - 스로틀링 시 레인 속도를 낮춘 뒤 스케줄러를 통해 1회만 재시도
+        - 5xx/모델 준비 중/연결 오류는 지수 백오프 후 최대 TRANSIENT_MAX_RETRIES회 재시도
+        - 재시도도 스케줄러를 다시 거침 (실제 호출이므로 RPM/TPM 차감)
+        - 대기열 초과/대기 시간 초과는 BedrockBusyError로 전파
+        - replay/stub 모드에서는 쿼터 대기를 생략 (재생 지연 측정에 토큰 버킷 대기가 섞이지 않도록)
+    """
+    scheduler = _admission_scheduler()
+    throttled = transient = 0
+    while True:
+        scheduler.acquire(lane, tokens, session_id, deadline)
+        try:
+            response = call(**kwargs)
+        except ClientError as e:
+            error = e.response.get("Error", {})
+            if error.get("Code") in THROTTLE_ERROR_CODES:
+                scheduler.on_throttle(lane)
+                throttled += 1
+                if throttled < 2:
+                    continue
+                raise
+            status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+            if (error.get("Code") in TRANSIENT_ERROR_CODES or status >= 500) and transient < TRANSIENT_MAX_RETRIES:
+                transient += 1
+                _transient_backoff(lane, transient, e)
+                continue
+            raise
+        except (BotoConnectionError, HTTPClientError) as e:
+            if transient < TRANSIENT_MAX_RETRIES:
+                transient += 1
+                _transient_backoff(lane, transient, e)
+                continue
+            raise
+        actual = usage_tokens(response) if usage_tokens else None
+        scheduler.on_success(lane, tokens, actual)
+        return response
+
+
+def _transient_backoff(lane: str, attempt: int, error: Exception) -> None:
+    """일시적 오류 재시도 전 대기 (지수 백오프 + 지터)"""
+    delay = TRANSIENT_BACKOFF_SEC * (2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+    logging.warning(f"[SCHED] 일시적 오류, {delay:.2f}s 후 재시도 ({attempt}/{TRANSIENT_MAX_RETRIES}): {lane} {error}")
+    time.sleep(delay)
 
 
 # =============================================================================
@@ -137,6 +507,66 @@ def get_kb_id_from_ssm(param: str = "/chatbot/bedrock/kb_id") -> str:
         return ""
 
 
+def parse_kb_ids(value: str) -> List[str]:
+    """
+    쉼표/공백으로 구분된 KB ID 문자열을 리스트로 변환합니다 (순서 유지, 중복 제거).
+    """
+    ids = []
+    for item in re.split(r"[,\s]+", value or ""):
+        if item and item not in ids:
+            ids.append(item)
+    return ids
+
+
+def get_kb_ids_from_ssm(param: str = "/chatbot/bedrock/kb_ids") -> List[str]:
+    """
+    SSM Parameter Store에서 검색 대상 Knowledge Base ID 목록을 조회합니다.
+    
+    Args:
+        param: SSM 파라미터 경로 (StringList, 기본값: /chatbot/bedrock/kb_ids)
+        
+    Returns:
+        List[str]: KB ID 리스트 (실패 시 단일 KB ID 파라미터로 대체, 그것도 없으면 빈 리스트)
+        
+    Note:
+        - 규정/AWS 서비스 문서/내부 FAQ 등 여러 KB로 분할된 코퍼스를 동시에 검색
+        - 목록 파라미터가 없는 기존 배포는 /chatbot/bedrock/kb_id 하나로 동작
+    """
+    try:
+        ssm = get_ssm()
+        ids = parse_kb_ids(ssm.get_parameter(Name=param)["Parameter"]["Value"])
+        if ids:
+            return ids
+    except Exception as e:
+        logging.warning(f"KB 목록 SSM 로드 실패, 단일 KB ID 사용: {e}")
+    return parse_kb_ids(get_kb_id_from_ssm())
+
+
+def get_kb_version_from_ssm(param: str = "/chatbot/bedrock/kb_version") -> str:
+    """
+    SSM Parameter Store에서 Knowledge Base 버전(인덱싱 세대)을 조회합니다.
+    
+    Args:
+        param: SSM 파라미터 경로 (기본값: /chatbot/bedrock/kb_version)
+        
+    Returns:
+        str: KB 버전 문자열 또는 빈 문자열 (실패 시)
+        
+    Note:
+        - 데이터 동기화(재인덱싱) 후 값을 갱신하면 시맨틱 캐시의 이전 답변이 무효화됨
+        - 실패 시 빈 문자열 반환 (버전 구분 없이 동작)
+    """
+    try:
+        ssm = get_ssm()
+        return ssm.get_parameter(Name=param)["Parameter"]["Value"]
+    except Exception as e:
+        logging.warning(f"KB 버전 SSM 로드 실패: {e}")
+        return ""
+
+
+_guardrail_cache: Dict[str, Tuple[float, Optional[Dict[str, str]]]] = {}
+
+
 def get_guardrail_from_ssm(prefix: str = "/chatbot/guardrail") -> Optional[Dict[str, str]]:
     """
     SSM Parameter Store에서 Guardrail 설정을 조회합니다.
@@ -154,16 +584,25 @@ def get_guardrail_from_ssm(prefix: str = "/chatbot/guardrail") -> Optional[Dict[
         - Terraform Stack3에서 생성된 Guardrail 정보를 조회
         - Guardrail은 us-east-1 리전에 배포되므로 해당 리전에서 조회
         - 실패 시 None 반환하여 Guardrail 없이 동작
+        - 성공 결과는 GUARDRAIL_CACHE_TTL_SEC, 실패(None)는 GUARDRAIL_FAILURE_TTL_SEC 동안만 캐시
     """
+    cached = _guardrail_cache.get(prefix)
+    if cached:
+        ttl = GUARDRAIL_CACHE_TTL_SEC if cached[1] is not None else GUARDRAIL_FAILURE_TTL_SEC
+        if time.monotonic() - cached[0] < ttl:
+            return cached[1]
+    
+    guardrail = None
     try:
         ssm = get_ssm(region="us-east-1")  # Guardrail 파라미터는 us-east-1에 존재
         gr_id = ssm.get_parameter(Name=f"{prefix}/id")["Parameter"]["Value"]
         gr_ver = ssm.get_parameter(Name=f"{prefix}/version")["Parameter"]["Value"]
         gr_rg = ssm.get_parameter(Name=f"{prefix}/region")["Parameter"]["Value"]
-        return {"id": gr_id, "version": gr_ver, "region": gr_rg}
+        guardrail = {"id": gr_id, "version": gr_ver, "region": gr_rg}
     except Exception as e:
         logging.warning(f"Guardrail SSM 로드 실패: {e}")
-        return None
+    _guardrail_cache[prefix] = (time.monotonic(), guardrail)
+    return guardrail
 
 
 # =============================================================================
@@ -232,6 +671,45 @@ def mask_possible_pii(text: str) -> str:
     return masked
 
 
+def check_input_guardrail(text: str, session_id: str = "default") -> bool:
+    """
+    질문이 입력 단계 Guardrail을 통과하는지 확인합니다 (모델 호출 없이 답변을 재사용하기 전 검사).
+    
+    Args:
+        text: 사용자 질문
+        session_id: 스케줄러 공정 대기열용 세션 식별자
+        
+    Returns:
+        bool: 통과하면 True, 차단되었거나 확인하지 못하면 False
+        
+    Note:
+        - PII 정규식에 걸리면 Guardrail 호출 없이 False
+        - Guardrail 설정은 invoke_nova_pro와 동일한 조건으로 적용 (미설정/리전 불일치 시 정규식만 검사)
+        - ApplyGuardrail 실패/혼잡 시 False → 호출자는 일반 파이프라인(converse + Guardrail)으로 처리
+    """
+    if any(regex.search(text or "") for regex in PII_REGEXES):
+        return False
+    
+    guardrail = get_guardrail_from_ssm()
+    if not (guardrail and guardrail.get("id") and guardrail.get("version")) or guardrail.get("region") != BEDROCK_RUNTIME_REGION:
+        return True
+    
+    try:
+        response = _scheduled_call(
+            GUARDRAIL_LANE,
+            session_id,
+            get_bedrock_runtime().apply_guardrail,
+            guardrailIdentifier=guardrail["id"],
+            guardrailVersion=guardrail["version"],
+            source="INPUT",
+            content=[{"text": {"text": text}}],
+        )
+        return response.get("action") != "GUARDRAIL_INTERVENED"
+    except Exception as e:
+        logging.warning(f"ApplyGuardrail 확인 실패: {e}")
+        return False
+
+
 # =============================================================================
 # 대화 히스토리 관리
 # =============================================================================
@@ -248,7 +726,7 @@ def clean_messages(messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
         
     처리 과정:
         1. system 역할 메시지 제거 (Bedrock converse API 미지원)
-        2. 차단 안내 assistant 메시지 제거 (불필요한 컨텍스트 제거)
+        2. 차단/지연 안내 assistant 메시지 제거 (불필요한 컨텍스트 제거)
         3. user 메시지로 시작하도록 보장 (대화 구조 정규화)
         
     Note:
@@ -265,8 +743,8 @@ def clean_messages(messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
         if role == "system":
             continue
         
-        # 차단 안내 assistant 메시지 제거 (이전 세션의 잔여물)
-        if role == "assistant" and BLOCK_NOTICE in content:
+        # 차단/지연 안내 assistant 메시지 제거 (이전 세션의 잔여물)
+        if role == "assistant" and (BLOCK_NOTICE in content or BUSY_NOTICE in content):
             continue
         
         cleaned.append({"role": role, "content": content})
@@ -282,7 +760,34 @@ def clean_messages(messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
 # Knowledge Base 검색 및 문서 재정렬
 # =============================================================================
 
-def rerank_documents(query: str, documents: List[str], top_n: int = 3) -> List[Tuple[str, float]]:
+class RetrievedChunk(NamedTuple):
+    """
+    검색 → 재정렬 → 프롬프트 구성까지 전달되는 문서 청크 레코드
+    
+    Fields:
+        text: 청크 본문
+        score: 관련성 점수 (Rerank 점수, Rerank 실패 시 0.0)
+        source_uri: 원본 문서 위치 (S3 URI 등)
+        chunk_id: KB 청크 ID
+        retrieval_score: 벡터 검색 점수
+        kb_id: 검색된 Knowledge Base ID
+    """
+    text: str
+    score: float
+    source_uri: str = ""
+    chunk_id: str = ""
+    retrieval_score: float = 0.0
+    kb_id: str = ""
+
+
+def _trim_for_rerank(text: str, max_chars: int) -> str:
+    """Rerank 전송용 본문 정리 (공백 압축, max_chars > 0이면 길이 제한)"""
+    text = " ".join(text.split())
+    return text[:max_chars] if max_chars > 0 else text
+
+
+def rerank_documents(query: str, documents: List[str], top_n: int = 3, session_id: str = "default",
+                     max_chars: int = RERANK_MAX_CHARS) -> List[Tuple[int, float]]:
     """
     AWS Bedrock Rerank 모델을 사용하여 검색된 문서들을 관련성 순으로 재정렬합니다.
     
@@ -290,19 +795,21 @@ def rerank_documents(query: str, documents: List[str], top_n: int = 3) -> List[T
         query: 사용자 질문 (재정렬 기준)
         documents: 재정렬할 문서 리스트
         top_n: 반환할 상위 문서 수 (기본값: 3)
+        session_id: 스케줄러 공정 대기열용 세션 식별자
+        max_chars: 문서당 전송 최대 글자 수 (0이면 공백 압축만 적용)
         
     Returns:
-        List[Tuple[str, float]]: (문서 내용, 관련성 점수) 튜플 리스트
+        List[Tuple[int, float]]: (documents 인덱스, 관련성 점수) 튜플 리스트
         
     처리 과정:
-        1. Bedrock Rerank API 호출 (ap-northeast-1 리전)
-        2. 각 문서에 대한 관련성 점수 계산
+        1. 문서 본문을 정리(공백 압축/길이 제한)하여 Rerank API 호출 (ap-northeast-1 리전)
+        2. 응답의 index로 원본 문서에 매핑 (응답 본문은 사용하지 않음)
         3. 점수 기준 내림차순 정렬
-        4. 실패 시 원본 순서 유지 (Graceful Degradation)
+        4. 실패/혼잡(BedrockBusyError) 시 원본 순서 유지 (Graceful Degradation)
         
     Note:
         - RAG 시스템의 핵심 구성요소
-        - 벡터 검색 결과의 정확도 향상
+        - 본문 대신 인덱스만 사용하므로 리전 간 왕복 페이로드와 매핑 오류 제거
         - 실패해도 서비스 중단 없이 동작
     """
     if not documents:
@@ -310,11 +817,14 @@ def rerank_documents(query: str, documents: List[str], top_n: int = 3) -> List[T
     
     try:
         client = get_bedrock_rerank()
-        response = client.rerank(
+        response = _scheduled_call(
+            RERANK_LANE,
+            session_id,
+            client.rerank,
             queries=[{"type": "TEXT", "textQuery": {"text": query}}],
             sources=[{
                 "type": "INLINE",
-                "inlineDocumentSource": {"type": "TEXT", "textDocument": {"text": doc}}
+                "inlineDocumentSource": {"type": "TEXT", "textDocument": {"text": _trim_for_rerank(doc, max_chars)}}
             } for doc in documents],
             rerankingConfiguration={
                 "type": "BEDROCK_RERANKING_MODEL",
@@ -325,28 +835,18 @@ def rerank_documents(query: str, documents: List[str], top_n: int = 3) -> List[T
             }
         )
         
-        # API 응답에서 문서와 점수 추출
+        # 응답의 index로 원본 문서 매핑 (범위 밖/중복 인덱스는 무시)
         scored = []
-        for i, result in enumerate(response.get("results", [])):
-            # Rerank API 응답 구조 디버깅
-            logging.info(f"[RERANK_DEBUG] Result {i}: {str(result)[:200]}...")
-            
-            text = (
-                result.get("document", {})
-                .get("inlineDocument", {})
-                .get("textDocument", {})
-                .get("text", "")
-            )
-            score = result.get("relevanceScore", 0.0)
-            
-            logging.info(f"[RERANK_DEBUG] Extracted - text_len: {len(text)}, score: {score}, text_preview: {repr(text[:50])}")
-            
-            # 빈 텍스트인 경우 원본 문서에서 찾기
-            if not text and i < len(documents):
-                text = documents[i]
-                logging.info(f"[RERANK_DEBUG] Using original document: {text[:50]}...")
-            
-            scored.append((text, score))
+        seen = set()
+        for result in response.get("results", []):
+            index = result.get("index")
+            if not isinstance(index, int) or not 0 <= index < len(documents) or index in seen:
+                logging.warning(f"[RERANK_DEBUG] 잘못된 결과 인덱스 무시: {index}")
+                continue
+            seen.add(index)
+            scored.append((index, float(result.get("relevanceScore", 0.0))))
+        
+        logging.info(f"[RERANK_DEBUG] Reranked indices: {scored}")
         
         # 관련성 점수 기준 내림차순 정렬
         return sorted(scored, key=lambda x: x[1], reverse=True)
@@ -354,116 +854,279 @@ def rerank_documents(query: str, documents: List[str], top_n: int = 3) -> List[T
     except Exception as e:
         # Rerank 실패 시 원본 순서 유지 (Graceful Degradation)
         logging.warning(f"Rerank 실패, 원본 순서 유지: {e}")
-        fallback = [(doc, 0.0) for doc in documents[:top_n]]
+        fallback = [(i, 0.0) for i in range(min(top_n, len(documents)))]
         logging.info(f"[RERANK_DEBUG] Fallback documents: {len(fallback)}")
         return fallback
 
 
-def query_kb(prompt: str, kb_id: str, num_docs: int = 3) -> Tuple[Optional[str], List[Tuple[str, float]], Dict[str, Any]]:
+def _location_uri(location: Dict[str, Any]) -> str:
+    """KB 검색 결과 location에서 원본 위치 문자열 추출 (S3/Web/Confluence 등 공통)"""
+    for value in location.values():
+        if isinstance(value, dict):
+            uri = value.get("uri") or value.get("url") or value.get("id")
+            if uri:
+                return str(uri)
+    return ""
+
+
+def _hit_to_chunk(hit: Dict[str, Any], kb_id: str = "") -> Optional[RetrievedChunk]:
     """
-    Knowledge Base에서 관련 문서를 검색하고 Rerank로 재정렬합니다.
+    KB 검색 결과 1건을 RetrievedChunk로 변환합니다.
+    
+    Note:
+        - content 구조는 KB 설정에 따라 dict 또는 list일 수 있음
+        - 출처는 metadata의 source-uri를 우선, 없으면 location 사용
+    """
+    content = hit.get("content")
+    if isinstance(content, dict) and "text" in content:
+        text = content["text"]
+    elif isinstance(content, list) and content and isinstance(content[0], dict) and "text" in content[0]:
+        text = content[0]["text"]
+    else:
+        logging.warning(f"[DEBUG] Unknown content structure: {content}")
+        return None
+    
+    metadata = hit.get("metadata") or {}
+    return RetrievedChunk(
+        text=text,
+        score=0.0,
+        source_uri=str(metadata.get("x-amz-bedrock-kb-source-uri") or _location_uri(hit.get("location") or {})),
+        chunk_id=str(metadata.get("x-amz-bedrock-kb-chunk-id", "")),
+        retrieval_score=float(hit.get("score") or 0.0),
+        kb_id=kb_id,
+    )
+
+
+def _retrieve_chunks(prompt: str, kb_id: str, num_docs: int, session_id: str,
+                     deadline: Optional[float] = None) -> Tuple[int, List[RetrievedChunk]]:
+    """
+    단일 Knowledge Base 벡터 검색 (예외는 호출자에게 전파)
+    
+    Note:
+        - deadline(time.monotonic 기준)이 지나면 호출하지 않고 TimeoutError,
+          스케줄러 대기도 deadline까지만 수행 (팬아웃 타임아웃 후 워커/쿼터 점유 방지)
+    
+    Returns:
+        Tuple[int, List[RetrievedChunk]]: (검색 결과 수, 본문이 있는 청크 리스트)
+    """
+    if deadline is not None and time.monotonic() >= deadline:
+        raise TimeoutError(f"검색 시작 전 마감 시각 경과 (kb={kb_id})")
+    client = get_bedrock_kb()
+    result = _scheduled_call(
+        RETRIEVE_LANE,
+        session_id,
+        client.retrieve,
+        deadline=deadline,
+        knowledgeBaseId=kb_id,
+        retrievalQuery={"text": prompt},
+        retrievalConfiguration={
+            "vectorSearchConfiguration": {"numberOfResults": num_docs}
+        },
+    )
+    hits = result.get("retrievalResults", [])
+    chunks = [c for c in (_hit_to_chunk(hit, kb_id) for hit in hits) if c is not None and c.text.strip()]
+    if hits and not chunks:
+        logging.warning(f"[DEBUG] No documents extracted from {len(hits)} hits (kb={kb_id})")
+    return len(hits), chunks
+
+
+def fuse_chunks(results: List[List[RetrievedChunk]], method: str = KB_FUSION_METHOD,
+                limit: int = KB_FUSION_MAX_CANDIDATES) -> List[RetrievedChunk]:
+    """
+    여러 KB의 검색 결과를 하나의 후보 목록으로 병합합니다.
+    
+    Args:
+        results: KB별 청크 리스트 (각 리스트는 검색 점수 내림차순)
+        method: rrf (Reciprocal Rank Fusion) | score (KB별 min-max 정규화 점수의 최대값)
+        limit: 반환할 최대 후보 수
+        
+    Returns:
+        List[RetrievedChunk]: 병합 점수 내림차순, 본문 기준 중복 제거된 청크 리스트
+        
+    Note:
+        - KB마다 점수 분포가 달라 원점수를 직접 비교하지 않음
+        - 같은 본문이 여러 KB에서 검색되면 점수를 합산(rrf)하거나 최대값(score) 사용
+        - 동점은 검색 점수 → 본문 순으로 정렬하여 KB 응답 순서와 무관한 결과 보장 (재생 시 Rerank 요청 일치)
+    """
+    fused: Dict[str, float] = {}
+    best: Dict[str, RetrievedChunk] = {}
+    
+    for chunks in results:
+        if not chunks:
+            continue
+        scores = [c.retrieval_score for c in chunks]
+        low, high = min(scores), max(scores)
+        for rank, chunk in enumerate(chunks):
+            key = " ".join(chunk.text.split())
+            if method == "score":
+                value = (chunk.retrieval_score - low) / (high - low) if high > low else 1.0
+                fused[key] = max(fused.get(key, 0.0), value)
+            else:
+                fused[key] = fused.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+            if key not in best or chunk.retrieval_score > best[key].retrieval_score:
+                best[key] = chunk
+    
+    ordered = sorted(fused, key=lambda k: (-round(fused[k], 9), -best[k].retrieval_score, k))[:limit]
+    return [best[key] for key in ordered]
+
+
+@lru_cache(maxsize=1)
+def _get_fanout_executor() -> ThreadPoolExecutor:
+    """다중 KB 병렬 검색용 프로세스 전역 스레드 풀"""
+    return ThreadPoolExecutor(max_workers=KB_FANOUT_MAX_WORKERS, thread_name_prefix="kb-fanout")
+
+
+def _error_message(e: Exception) -> str:
+    return f"ClientError: {e}" if isinstance(e, ClientError) else str(e)
+
+
+def query_kbs(prompt: str, kb_ids: List[str], num_docs: int = 3, session_id: str = "default",
+              timeout: float = KB_FANOUT_TIMEOUT_SEC, fusion: str = KB_FUSION_METHOD) -> Tuple[Optional[str], List[RetrievedChunk], Dict[str, Any]]:
+    """
+    여러 Knowledge Base를 동시에 검색하고 병합 후 Rerank로 재정렬합니다.
     
     Args:
         prompt: 사용자 질문
-        kb_id: Knowledge Base ID
-        num_docs: 검색할 문서 수 (기본값: 3)
+        kb_ids: 검색할 Knowledge Base ID 리스트
+        num_docs: KB별 검색 문서 수 (기본값: 3)
+        session_id: 스케줄러 공정 대기열용 세션 식별자
+        timeout: KB별 검색 타임아웃(초) - 2개 이상일 때 적용
+        fusion: 병합 방식 (rrf | score)
         
     Returns:
         Tuple containing:
         - Optional[str]: 결합된 컨텍스트 문서 (실패 시 None)
-        - List[Tuple[str, float]]: (문서, 관련성점수) 리스트
-        - Dict[str, Any]: 메타데이터 {'retrieved': int, 'error': str|None}
+        - List[RetrievedChunk]: 재정렬된 청크 리스트
+        - Dict[str, Any]: 메타데이터 {'retrieved': int, 'error': str|None, 'busy': bool,
+                                       'per_kb': {kb_id: {'retrieved', 'ms', 'error'}},
+                                       'rerank_ms': float (Rerank 수행 시)}
         
     처리 과정:
-        1. Knowledge Base 벡터 검색 수행
-        2. 검색 결과에서 텍스트 내용 추출
-        3. Rerank 모델로 관련성 기준 재정렬
-        4. 상위 문서들을 하나의 컨텍스트로 결합
+        1. KB별 벡터 검색을 스레드 풀에서 병렬 수행 (KB가 1개면 현재 스레드에서 수행)
+        2. 타임아웃/오류 KB는 제외하고 나머지 결과 사용
+        3. RRF 또는 정규화 점수로 병합, 본문 기준 중복 제거
+        4. 병합된 후보 한 묶음만 Rerank로 재정렬
+        5. 상위 문서들을 하나의 컨텍스트로 결합
         
     Note:
-        - RAG(Retrieval-Augmented Generation)의 핵심 구현
-        - Terraform Stack2에서 생성된 KB 사용
-        - 검색 실패 시에도 안전하게 처리
+        - 모든 KB가 실패했거나, 일부 실패 + 나머지 KB 결과가 비어 있으면 error 설정 (일부 실패는 per_kb에 기록)
+        - 모든 KB가 혼잡(BedrockBusyError)으로 거절되면 busy=True
+        - 마감 시각이 스케줄러 대기에도 적용되어 타임아웃된 검색이 워커/쿼터를 계속 점유하지 않음
     """
-    meta = {"retrieved": 0, "error": None}
+    meta: Dict[str, Any] = {"retrieved": 0, "error": None, "busy": False, "per_kb": {}}
+    if not kb_ids:
+        meta["error"] = "Knowledge Base ID가 없습니다."
+        return None, [], meta
     
-    try:
-        # Knowledge Base 벡터 검색 수행
-        client = get_bedrock_kb()
-        result = client.retrieve(
-            knowledgeBaseId=kb_id,
-            retrievalQuery={"text": prompt},
-            retrievalConfiguration={
-                "vectorSearchConfiguration": {"numberOfResults": num_docs}
-            },
-        )
-        
-        hits = result.get("retrievalResults", [])
-        meta["retrieved"] = len(hits)
-        
-        # 검색 결과에서 텍스트 내용 추출
-        docs = []
-        for i, hit in enumerate(hits):
-            content = hit.get("content")
-            logging.info(f"[DEBUG] Hit {i+1} content type: {type(content)}, content: {str(content)[:200]}...")
-            
-            # content 구조는 KB 설정에 따라 다를 수 있음
-            if isinstance(content, dict) and "text" in content:
-                text = content["text"]
-                docs.append(text)
-                logging.info(f"[DEBUG] Extracted text (dict): {text[:100]}...")
-            elif isinstance(content, list) and content and isinstance(content[0], dict) and "text" in content[0]:
-                text = content[0]["text"]
-                docs.append(text)
-                logging.info(f"[DEBUG] Extracted text (list): {text[:100]}...")
+    # 2개 이상일 때만 타임아웃 적용 - 마감 시각을 워커/스케줄러까지 전달
+    deadline = time.monotonic() + timeout if len(kb_ids) > 1 else None
+    
+    def run(kb_id: str):
+        started = time.perf_counter()
+        count, chunks = _retrieve_chunks(prompt, kb_id, num_docs, session_id, deadline)
+        return count, chunks, (time.perf_counter() - started) * 1000
+    
+    results: List[List[RetrievedChunk]] = []
+    errors: List[Exception] = []
+    
+    if len(kb_ids) == 1:
+        try:
+            outcomes = {kb_ids[0]: run(kb_ids[0])}
+        except Exception as e:
+            outcomes = {kb_ids[0]: e}
+    else:
+        executor = _get_fanout_executor()
+        futures = {kb_id: executor.submit(run, kb_id) for kb_id in kb_ids}
+        wait_futures(futures.values(), timeout=max(0.0, deadline - time.monotonic()))
+        outcomes = {}
+        for kb_id, fut in futures.items():
+            if not fut.done():
+                fut.cancel()
+                outcomes[kb_id] = TimeoutError(f"검색 타임아웃 ({timeout:.1f}s)")
+            elif fut.exception() is not None:
+                outcomes[kb_id] = fut.exception()
             else:
-                logging.warning(f"[DEBUG] Unknown content structure: {content}")
-        
-        if not docs:
-            logging.warning(f"[DEBUG] No documents extracted from {len(hits)} hits")
+                outcomes[kb_id] = fut.result()
+    
+    for kb_id, outcome in outcomes.items():
+        if isinstance(outcome, Exception):
+            errors.append(outcome)
+            meta["per_kb"][kb_id] = {"retrieved": 0, "ms": None, "error": _error_message(outcome)}
+            logging.warning(f"[KB_FANOUT] {kb_id} 검색 실패: {outcome}")
+            continue
+        count, chunks, ms = outcome
+        meta["retrieved"] += count
+        meta["per_kb"][kb_id] = {"retrieved": count, "ms": round(ms, 1), "error": None}
+        results.append(chunks)
+    
+    # 실패한 KB가 있고 나머지 KB에서도 문서가 없으면 실패로 보고 (미히트로 오인하지 않도록)
+    if errors and not any(results):
+        if all(isinstance(e, BedrockBusyError) for e in errors):
+            meta["error"] = BUSY_NOTICE
+            meta["busy"] = True
+        else:
+            meta["error"] = "; ".join(_error_message(e) for e in errors)
+        return None, [], meta
+    
+    try:
+        candidates = results[0] if len(results) == 1 else fuse_chunks(results, method=fusion)
+        if not candidates:
             return None, [], meta
         
-        logging.info(f"[DEBUG] Successfully extracted {len(docs)} documents")
+        logging.info(f"[DEBUG] Rerank candidates: {len(candidates)} from {len(results)} KB(s)")
         
-        # Rerank 모델로 관련성 기준 재정렬
-        reranked = rerank_documents(prompt, docs, top_n=min(3, len(docs)))
+        # Rerank 모델로 관련성 기준 재정렬 후 원본 청크에 점수 반영
+        started = time.perf_counter()
+        ranking = rerank_documents(
+            prompt, [c.text for c in candidates], top_n=min(3, len(candidates)), session_id=session_id
+        )
+        meta["rerank_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        reranked = [candidates[i]._replace(score=score) for i, score in ranking]
         
         # Rerank 결과 디버깅
-        logging.info(f"[DEBUG] Reranked documents: {len(reranked)}")
-        for i, (doc, score) in enumerate(reranked):
-            logging.info(f"[DEBUG] Reranked[{i}] score={score:.3f}, doc_type={type(doc)}, doc_len={len(doc) if doc else 0}, doc_preview={repr(doc[:50]) if doc else 'None'}")
-        
-        # 빈 문서 필터링 (더 관대한 조건)
-        filtered_reranked = [(doc, score) for doc, score in reranked if doc is not None and str(doc).strip()]
-        logging.info(f"[DEBUG] After filtering: {len(filtered_reranked)} documents")
-        
-        for i, (doc, score) in enumerate(filtered_reranked):
-            logging.info(f"[DEBUG] Filtered doc {i+1} (score: {score:.3f}): {doc[:100]}...")
+        for i, chunk in enumerate(reranked):
+            logging.info(f"[DEBUG] Reranked[{i}] score={chunk.score:.3f}, retrieval={chunk.retrieval_score:.3f}, kb={chunk.kb_id}, source={chunk.source_uri}, doc_len={len(chunk.text)}")
         
         # 상위 문서들을 하나의 컨텍스트로 결합
-        context = "\n\n".join([doc for doc, _ in filtered_reranked])
-        
-        # 필터링된 결과가 비어있으면 원본 사용
-        final_reranked = filtered_reranked if filtered_reranked else reranked
-        logging.info(f"[DEBUG] Final reranked count: {len(final_reranked)}")
-        
-        return context, final_reranked, meta
+        context = "\n\n".join(chunk.text for chunk in reranked)
         
         return context, reranked, meta
     
-    except ClientError as e:
-        meta["error"] = f"ClientError: {e}"
-        return None, [], meta
     except Exception as e:
         meta["error"] = str(e)
         return None, [], meta
 
 
+def query_kb(prompt: str, kb_id: str, num_docs: int = 3, session_id: str = "default") -> Tuple[Optional[str], List[RetrievedChunk], Dict[str, Any]]:
+    """
+    Knowledge Base에서 관련 문서를 검색하고 Rerank로 재정렬합니다.
+    
+    Args:
+        prompt: 사용자 질문
+        kb_id: Knowledge Base ID
+        num_docs: 검색할 문서 수 (기본값: 3)
+        session_id: 스케줄러 공정 대기열용 세션 식별자
+        
+    Returns:
+        Tuple containing:
+        - Optional[str]: 결합된 컨텍스트 문서 (실패 시 None)
+        - List[RetrievedChunk]: 재정렬된 청크 리스트 (본문, 점수, 출처, 청크 ID, 검색 점수)
+        - Dict[str, Any]: 메타데이터 {'retrieved': int, 'error': str|None, 'busy': bool, 'per_kb': dict}
+        
+    Note:
+        - RAG(Retrieval-Augmented Generation)의 핵심 구현
+        - Terraform Stack2에서 생성된 KB 사용
+        - 단일 KB용 query_kbs() 래퍼 (검색 실패 시에도 안전하게 처리)
+    """
+    return query_kbs(prompt, [kb_id], num_docs, session_id=session_id)
+
+
 # =============================================================================
 # Nova Pro 모델 호출
 # =============================================================================
 
-def invoke_nova_pro(messages: List[Dict[str, str]], *, max_tokens: int, temperature: float, top_p: float) -> Tuple[str, bool]:
+def invoke_nova_pro(messages: List[Dict[str, str]], *, max_tokens: int, temperature: float, top_p: float, session_id: str = "default",
+                    meta: Optional[Dict[str, Any]] = None) -> Tuple[str, bool]:
     """
     Amazon Nova Pro 모델을 호출하여 응답을 생성합니다.
     
@@ -472,6 +1135,8 @@ def invoke_nova_pro(messages: List[Dict[str, str]], *, max_tokens: int, temperat
         max_tokens: 최대 생성 토큰 수
         temperature: 창의성 조절 (0.0-1.0)
         top_p: 토큰 선택 범위 조절 (0.0-1.0)
+        session_id: 스케줄러 공정 대기열용 세션 식별자
+        meta: 호출 결과를 채울 dict (선택) - {'usage': dict, 'stop_reason': str, 'busy': bool, 'error': str|None}
         
     Returns:
         Tuple[str, bool]: (응답 텍스트, Guardrail 차단 여부)
@@ -480,14 +1145,19 @@ def invoke_nova_pro(messages: List[Dict[str, str]], *, max_tokens: int, temperat
         1. 메시지 히스토리 정리 및 검증
         2. Bedrock Converse API 형식으로 변환
         3. Guardrail 설정 적용 (있는 경우)
-        4. Nova Pro 모델 호출
+        4. 스케줄러로 TPM/RPM 확보 후 Nova Pro 모델 호출
         5. 응답 파싱 및 PII 마스킹
         
     Note:
         - us-east-1 리전에서 호출 (Nova Pro 가용 리전)
+        - 혼잡으로 요청이 거절되면 BUSY_NOTICE 반환
         - Guardrail과 PII 마스킹으로 이중 보안
         - 실패 시에도 안전한 오류 메시지 반환
     """
+    if meta is None:
+        meta = {}
+    meta.update({"usage": {}, "stop_reason": "", "busy": False, "error": None})
+    
     # 1. 메시지 히스토리 정리
     messages = clean_messages(messages)
     
@@ -524,10 +1194,20 @@ def invoke_nova_pro(messages: List[Dict[str, str]], *, max_tokens: int, temperat
     # 5. Nova Pro 모델 호출
     try:
         client = get_bedrock_runtime()
-        response = client.converse(**kwargs)
+        estimated = sum(estimate_tokens(msg["content"]) for msg in messages) + max_tokens
+        response = _scheduled_call(
+            CONVERSE_LANE,
+            session_id,
+            client.converse,
+            tokens=estimated,
+            usage_tokens=lambda r: r.get("usage", {}).get("totalTokens"),
+            **kwargs,
+        )
         
         # Guardrail 차단 여부 확인
         stop_reason = response.get("stopReason", "")
+        meta["usage"] = response.get("usage", {})
+        meta["stop_reason"] = stop_reason
         gr_blocked = "guardrail" in stop_reason.lower()
         
         # 응답 텍스트 추출
@@ -542,8 +1222,13 @@ def invoke_nova_pro(messages: List[Dict[str, str]], *, max_tokens: int, temperat
             return "개인정보/부적절한 표현에 대한 응답은 제공되지 않습니다.", True
         
         # 기타 예외 상황
+        meta["error"] = f"empty output (stopReason={stop_reason})"
         return f"응답 실패: 모델 출력이 비어있습니다. (stopReason={stop_reason})", False
     
+    except BedrockBusyError:
+        meta["busy"] = True
+        return BUSY_NOTICE, False
     except Exception as e:
         logging.error(f"Nova Pro 호출 실패: {e}")
+        meta["error"] = str(e)
         return f"응답 실패: {e}", False
\ No newline at end of file
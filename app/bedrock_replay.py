@@ -0,0 +1,618 @@
+# -*- coding: utf-8 -*-
+"""
+bedrock_replay.py
+
+Bedrock/SSM 호출을 기록(record)하고 네트워크 없이 재생(replay)하는 성능 회귀 테스트 계층
+
+주요 기능:
+1. record 모드: 실제 요청/응답과 관측 지연시간을 gzip JSON Lines 픽스처로 저장
+2. replay 모드: 픽스처를 원래 지연시간(또는 배율 적용)으로 재생, AWS 호출 없음
+   stub 모드: 픽스처 없이 요청에서 합성한 응답 반환 (로컬 개발/배치 부하 시험용)
+3. 저장 전 개인정보 마스킹 및 계정 ID/응답 메타데이터 제거 (Redaction)
+4. 기록된 하루 트래픽으로 query_kbs / invoke_nova_pro를 다시 실행하여 지연·페이로드 회귀 검출
+
+사용 방법 (환경변수):
+- BEDROCK_TRAFFIC_MODE: record | replay | stub (미설정 시 일반 boto3 클라이언트)
+- BEDROCK_TRAFFIC_FIXTURE: 픽스처 파일 경로 (기본값: bedrock_traffic.jsonl.gz)
+- BEDROCK_REPLAY_SPEED: 재생 지연 배율 (1.0=원래 속도, 0=대기 없음)
+- BEDROCK_STUB_LATENCY_MS: stub 모드 호출당 지연(ms, 기본값 0)
+
+    BEDROCK_TRAFFIC_MODE=record streamlit run streamlit_ui.py
+    python bedrock_replay.py bedrock_traffic.jsonl.gz --speed 0.5
+
+아키텍처:
+- bedrock_client의 클라이언트 팩토리가 모드 설정 시 이 모듈의 traffic_client()를 사용
+- 재생 시 동일 요청(정규화 지문 일치)을 우선 매칭, 없으면 같은 오퍼레이션을 기록 순서대로 사용
+  → 코드 변경으로 요청이 달라져도 실제 응답 형태(list/dict content 등)로 재실행 가능
+"""
+
+import argparse
+import atexit
+import copy
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+from botocore.response import StreamingBody
+
+from bedrock_client import mask_possible_pii
+
+# =============================================================================
+# 설정 상수
+# =============================================================================
+
+TRAFFIC_MODE_ENV = "BEDROCK_TRAFFIC_MODE"
+TRAFFIC_FIXTURE_ENV = "BEDROCK_TRAFFIC_FIXTURE"
+REPLAY_SPEED_ENV = "BEDROCK_REPLAY_SPEED"
+STUB_LATENCY_ENV = "BEDROCK_STUB_LATENCY_MS"
+
+DEFAULT_FIXTURE_PATH = "bedrock_traffic.jsonl.gz"
+
+# ARN 등에 포함된 AWS 계정 ID 마스킹
+ACCOUNT_ID_RE = re.compile(r"(?<=:)\d{12}(?=:)")
+MASKED_ACCOUNT_ID = "000000000000"
+
+
+# =============================================================================
+# 직렬화 / 마스킹 유틸리티
+# =============================================================================
+
+def redact(value: Any) -> Any:
+    """
+    픽스처 저장용으로 요청/응답을 정리합니다.
+
+    Note:
+        - 문자열은 mask_possible_pii() + 계정 ID 마스킹
+        - ResponseMetadata(요청 ID, 헤더)는 재생에 불필요하므로 제거
+        - datetime 등 JSON 비호환 값은 문자열로 변환
+    """
+    if isinstance(value, dict):
+        return {k: redact(v) for k, v in value.items() if k != "ResponseMetadata"}
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    if isinstance(value, str):
+        return ACCOUNT_ID_RE.sub(MASKED_ACCOUNT_ID, mask_possible_pii(value))
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return str(value)
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+
+def fingerprint(service: str, region: str, op: str, request: Any) -> str:
+    """마스킹된 요청 기준 지문 (기록/재생 양쪽에서 동일하게 계산)"""
+    raw = f"{service}|{region}|{op}|{_dumps(request)}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _buffer_body(response: Any) -> Tuple[Any, Optional[str]]:
+    """
+    응답의 StreamingBody(invoke_model 등)를 메모리로 읽어 재사용 가능하게 만듭니다.
+
+    Returns:
+        (호출자에게 돌려줄 응답, 기록용 본문 텍스트 또는 None)
+    """
+    if isinstance(response, dict) and isinstance(response.get("body"), StreamingBody):
+        data = response["body"].read()
+        response = dict(response, body=StreamingBody(io.BytesIO(data), len(data)))
+        return response, data.decode("utf-8", errors="replace")
+    return response, None
+
+
+def _restore_body(response: Any) -> Any:
+    """기록된 본문 텍스트를 StreamingBody로 복원"""
+    body = response.get("body") if isinstance(response, dict) else None
+    if isinstance(body, dict) and "__stream__" in body:
+        data = body["__stream__"].encode("utf-8")
+        response["body"] = StreamingBody(io.BytesIO(data), len(data))
+    return response
+
+
+def load_fixture(path: str) -> List[Dict[str, Any]]:
+    """픽스처 파일의 모든 레코드를 seq 순서로 로드"""
+    records = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    records.sort(key=lambda r: r.get("seq", 0))
+    return records
+
+
+# =============================================================================
+# 기록 (record)
+# =============================================================================
+
+class FixtureWriter:
+    """
+    프로세스 전역 픽스처 기록기 (스레드 안전)
+
+    Note:
+        - Streamlit 세션 스레드들이 동시에 기록하므로 Lock으로 직렬화
+        - 레코드마다 flush하여 컨테이너 종료 시에도 기록 보존
+        - 기존 파일에 이어 쓸 때는 seq/t를 마지막 레코드 다음부터 계속 (재시작 후에도 순서 유지)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        last_seq, last_t = self._tail(path)
+        self._seq = last_seq
+        self._start = time.time() - last_t
+        self._file = gzip.open(path, "at", encoding="utf-8")
+        atexit.register(self.close)
+
+    @staticmethod
+    def _tail(path: str) -> Tuple[int, float]:
+        """기존 픽스처의 마지막 seq와 t (없거나 읽을 수 없으면 0)"""
+        last_seq, last_t = 0, 0.0
+        if not os.path.exists(path):
+            return last_seq, last_t
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    last_seq = max(last_seq, int(rec.get("seq", 0)))
+                    last_t = max(last_t, float(rec.get("t", 0.0)))
+        except (OSError, EOFError) as e:
+            logging.warning(f"[TRAFFIC] 기존 픽스처 끝까지 읽지 못함 ({e}), seq={last_seq}부터 이어서 기록")
+        return last_seq, last_t
+
+    def write(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self._seq += 1
+            record["seq"] = self._seq
+            record["t"] = round(time.time() - self._start, 3)
+            self._file.write(_dumps(record) + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+class RecordingClient:
+    """
+    실제 boto3 클라이언트를 감싸 API 호출을 픽스처로 기록하는 프록시
+
+    Note:
+        - client.meta.method_to_api_mapping에 있는 API 메서드만 기록
+        - 예외(ClientError)도 오류 코드/메시지로 기록 후 그대로 전파
+        - StreamingBody 응답은 읽어서 기록하고 호출자에게는 새 스트림으로 전달
+    """
+
+    def __init__(self, client, service: str, region: str, writer: FixtureWriter):
+        self._client = client
+        self._service = service
+        self._region = region
+        self._writer = writer
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._client, name)
+        if name not in self._client.meta.method_to_api_mapping:
+            return attr
+
+        def recorded(**kwargs):
+            request = redact(kwargs)
+            record = {
+                "svc": self._service,
+                "region": self._region,
+                "op": name,
+                "key": fingerprint(self._service, self._region, name, request),
+                "req": request,
+                "req_bytes": len(_dumps(request).encode("utf-8")),
+            }
+            started = time.perf_counter()
+            try:
+                response = attr(**kwargs)
+            except ClientError as e:
+                record["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                record["error"] = {
+                    "Code": e.response.get("Error", {}).get("Code", ""),
+                    "Message": redact(e.response.get("Error", {}).get("Message", "")),
+                }
+                self._writer.write(record)
+                raise
+            record["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            response, body = _buffer_body(response)
+            record["resp"] = redact(dict(response, body={"__stream__": body}) if body is not None else response)
+            record["resp_bytes"] = len(_dumps(record["resp"]).encode("utf-8"))
+            self._writer.write(record)
+            return response
+
+        return recorded
+
+
+# =============================================================================
+# 재생 (replay)
+# =============================================================================
+
+class ReplayStore:
+    """
+    픽스처 레코드 저장소 (지문 우선 매칭 + 오퍼레이션별 순차 fallback)
+
+    Note:
+        - 각 레코드는 한 번만 사용 (실제 트래픽의 호출 수와 동일하게 소비)
+        - 사용 여부는 레코드 객체 단위로 추적 (seq가 중복된 이전 픽스처도 전부 재생)
+        - 재생 통계(호출 수, 미스, 페이로드 크기)를 함께 집계
+    """
+
+    def __init__(self, records: List[Dict[str, Any]]):
+        self._lock = threading.Lock()
+        self._by_key: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        self._by_op: Dict[Tuple[str, str, str], Deque[Dict[str, Any]]] = defaultdict(deque)
+        self._used = set()
+        self.stats: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        for rec in records:
+            self._by_key[rec["key"]].append(rec)
+            self._by_op[(rec["svc"], rec["region"], rec["op"])].append(rec)
+
+    def _pop_unused(self, queue: Deque[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        while queue:
+            rec = queue.popleft()
+            if id(rec) not in self._used:
+                self._used.add(id(rec))
+                return rec
+        return None
+
+    def take(self, service: str, region: str, op: str, request: Any) -> Optional[Dict[str, Any]]:
+        key = fingerprint(service, region, op, request)
+        req_bytes = len(_dumps(request).encode("utf-8"))
+        with self._lock:
+            rec = self._pop_unused(self._by_key.get(key, deque()))
+            exact = rec is not None
+            if rec is None:
+                rec = self._pop_unused(self._by_op.get((service, region, op), deque()))
+
+            stats = self.stats[f"{service}@{region}:{op}"]
+            stats["calls"] += 1
+            stats["req_bytes"] += req_bytes
+            if rec is None:
+                stats["misses"] += 1
+                return None
+            stats["exact"] += int(exact)
+            stats["recorded_req_bytes"] += rec.get("req_bytes", 0)
+            stats["resp_bytes"] += rec.get("resp_bytes", 0)
+            stats["recorded_ms"] += rec.get("latency_ms", 0.0)
+            return rec
+
+
+class ReplayMissError(Exception):
+    """재생할 픽스처 레코드가 없는 호출"""
+
+
+class ReplayClient:
+    """
+    픽스처를 재생하는 가짜 클라이언트 (네트워크 호출 없음)
+
+    Note:
+        - 기록된 latency_ms × speed 만큼 대기하여 원래 타이밍 재현
+        - 기록된 오류는 동일한 코드의 ClientError로 재발생
+    """
+
+    def __init__(self, store: ReplayStore, service: str, region: str, speed: float):
+        self._store = store
+        self._service = service
+        self._region = region
+        self._speed = speed
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def replayed(**kwargs):
+            rec = self._store.take(self._service, self._region, name, redact(kwargs))
+            if rec is None:
+                raise ReplayMissError(f"픽스처 없음: {self._service}@{self._region}:{name}")
+            if self._speed > 0:
+                time.sleep(rec.get("latency_ms", 0.0) * self._speed / 1000.0)
+            if "error" in rec:
+                raise ClientError({"Error": dict(rec["error"])}, name)
+            return _restore_body(copy.deepcopy(rec["resp"]))
+
+        return replayed
+
+
+# =============================================================================
+# 스텁 (stub)
+# =============================================================================
+
+class StubClient:
+    """
+    요청 내용으로 응답을 합성하는 가짜 클라이언트 (픽스처/네트워크 불필요)
+
+    Note:
+        - retrieve / rerank / converse는 실제 응답과 같은 구조로 결정적인 값을 반환
+        - SSM 조회는 ParameterNotFound, 그 외 오퍼레이션은 ValidationException으로 실패
+        - 호출마다 latency_ms만큼 대기하여 동시성/쿼터 동작 확인 가능
+    """
+
+    def __init__(self, service: str, region: str, latency_ms: float):
+        self._service = service
+        self._region = region
+        self._latency_ms = latency_ms
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        handler = getattr(self, f"_stub_{name}", None)
+
+        def stubbed(**kwargs):
+            if self._latency_ms > 0:
+                time.sleep(self._latency_ms / 1000.0)
+            if handler is None:
+                code = "ParameterNotFound" if self._service == "ssm" else "ValidationException"
+                raise ClientError({"Error": {"Code": code, "Message": f"stub: {name} 미지원"}}, name)
+            return handler(**kwargs)
+
+        return stubbed
+
+    @staticmethod
+    def _stub_retrieve(knowledgeBaseId: str, retrievalQuery: Dict[str, Any], retrievalConfiguration: Dict[str, Any]):
+        query = retrievalQuery.get("text", "")
+        count = retrievalConfiguration.get("vectorSearchConfiguration", {}).get("numberOfResults", 3)
+        digest = hashlib.sha1(query.encode("utf-8")).hexdigest()[:8]
+        return {"retrievalResults": [{
+            "content": {"type": "TEXT", "text": f"[stub {knowledgeBaseId}#{i}] {query[:200]}"},
+            "score": round(0.9 - 0.1 * i, 3),
+            "location": {"type": "S3", "s3Location": {"uri": f"s3://stub/{knowledgeBaseId}/{digest}-{i}.md"}},
+            "metadata": {"x-amz-bedrock-kb-chunk-id": f"{digest}-{i}"},
+        } for i in range(count)]}
+
+    @staticmethod
+    def _stub_rerank(queries: List[Dict[str, Any]], sources: List[Dict[str, Any]],
+                     rerankingConfiguration: Dict[str, Any]):
+        top_n = rerankingConfiguration.get("bedrockRerankingConfiguration", {}).get("numberOfResults", len(sources))
+        return {"results": [
+            {"index": i, "relevanceScore": round(1.0 - 0.1 * i, 3)} for i in range(min(top_n, len(sources)))
+        ]}
+
+    @staticmethod
+    def _stub_converse(messages: List[Dict[str, Any]], inferenceConfig: Dict[str, Any], **kwargs):
+        prompt = "".join(c.get("text", "") for c in (messages[-1].get("content", []) if messages else []))
+        question = prompt.rsplit("[질문]\n", 1)[-1]
+        input_tokens = sum(len(c.get("text", "")) for m in messages for c in m.get("content", [])) // 2 + 1
+        text = f"[stub] {question[:200]}"
+        output_tokens = min(len(text) // 2 + 1, inferenceConfig.get("maxTokens", 2048))
+        return {
+            "output": {"message": {"role": "assistant", "content": [{"text": text}]}},
+            "stopReason": "end_turn",
+            "usage": {"inputTokens": input_tokens, "outputTokens": output_tokens,
+                      "totalTokens": input_tokens + output_tokens},
+        }
+
+
+# =============================================================================
+# 클라이언트 팩토리 연동
+# =============================================================================
+
+_state_lock = threading.Lock()
+_writer: Optional[FixtureWriter] = None
+_store: Optional[ReplayStore] = None
+
+
+def get_traffic_mode() -> str:
+    """현재 트래픽 모드 (off | record | replay | stub)"""
+    return os.getenv(TRAFFIC_MODE_ENV, "").strip().lower() or "off"
+
+
+def get_replay_store() -> Optional[ReplayStore]:
+    """replay 모드에서 사용 중인 저장소 (통계 조회용)"""
+    return _store
+
+
+def traffic_client(service: str, region: str, factory: Callable[..., Any]):
+    """
+    트래픽 모드에 맞는 클라이언트를 생성합니다.
+
+    Args:
+        service: boto3 서비스 이름 (예: bedrock-runtime)
+        region: AWS 리전
+        factory: 실제 클라이언트 생성 함수 (boto3.client 시그니처)
+
+    Returns:
+        RecordingClient | ReplayClient | StubClient | boto3.client
+    """
+    global _writer, _store
+    mode = get_traffic_mode()
+    path = os.getenv(TRAFFIC_FIXTURE_ENV, DEFAULT_FIXTURE_PATH)
+
+    if mode == "record":
+        with _state_lock:
+            if _writer is None:
+                _writer = FixtureWriter(path)
+                logging.info(f"[TRAFFIC] record 모드: {path}")
+        return RecordingClient(factory(service, region_name=region), service, region, _writer)
+
+    if mode == "replay":
+        with _state_lock:
+            if _store is None:
+                _store = ReplayStore(load_fixture(path))
+                logging.info(f"[TRAFFIC] replay 모드: {path}")
+        speed = float(os.getenv(REPLAY_SPEED_ENV, "1.0"))
+        return ReplayClient(_store, service, region, speed)
+
+    if mode == "stub":
+        return StubClient(service, region, float(os.getenv(STUB_LATENCY_ENV, "0")))
+
+    return factory(service, region_name=region)
+
+
+# =============================================================================
+# 트래픽 재실행 (회귀 테스트 CLI)
+# =============================================================================
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round((len(ordered) - 1) * q / 100.0)))]
+
+
+def _entry_calls(records: List[Dict[str, Any]]) -> List[Tuple[float, str, Dict[str, Any]]]:
+    """
+    기록된 하위 호출에서 파이프라인 진입점 호출(query_kbs / invoke_nova_pro)을 복원
+
+    Returns:
+        List[(기록 시각, 진입점 이름, 인자 dict)]
+
+    Note:
+        - 다중 KB 검색은 KB별 retrieve N건 + rerank 1건으로 기록되므로
+          같은 질의의 retrieve를 다음 rerank(또는 같은 KB 재조회) 전까지 query_kbs 1건으로 묶음
+        - 동시 세션의 기록이 섞여도 질의 텍스트 단위로 묶이므로 순서가 교차해도 됨
+    """
+    entries = []
+    open_fanouts: Dict[str, Dict[str, Any]] = {}  # 질의 텍스트 → rerank 전인 query_kbs 인자
+    for rec in records:
+        req = rec.get("req") or {}
+        if rec["op"] == "retrieve":
+            prompt = req.get("retrievalQuery", {}).get("text", "")
+            kb_id = req.get("knowledgeBaseId", "")
+            num_docs = (req.get("retrievalConfiguration", {})
+                           .get("vectorSearchConfiguration", {})
+                           .get("numberOfResults", 3))
+            kwargs = open_fanouts.get(prompt)
+            if kwargs is None or kb_id in kwargs["kb_ids"] or kwargs["num_docs"] != num_docs:
+                kwargs = {"prompt": prompt, "kb_ids": [], "num_docs": num_docs}
+                open_fanouts[prompt] = kwargs
+                entries.append((rec["t"], "query_kbs", kwargs))
+            kwargs["kb_ids"].append(kb_id)
+        elif rec["op"] == "rerank":
+            queries = req.get("queries") or [{}]
+            open_fanouts.pop(queries[0].get("textQuery", {}).get("text", ""), None)
+        elif rec["op"] == "converse":
+            messages = [
+                {"role": m.get("role"), "content": "".join(c.get("text", "") for c in m.get("content", []))}
+                for m in req.get("messages", [])
+            ]
+            cfg = req.get("inferenceConfig", {})
+            entries.append((rec["t"], "invoke_nova_pro", {
+                "messages": messages,
+                "max_tokens": cfg.get("maxTokens", 2048),
+                "temperature": cfg.get("temperature", 0.6),
+                "top_p": cfg.get("topP", 0.9),
+            }))
+    return entries
+
+
+def run_replay(path: str, *, speed: float, concurrency: int, pace: bool) -> Dict[str, Any]:
+    """
+    픽스처의 트래픽을 현재 코드의 query_kbs / invoke_nova_pro로 재실행합니다.
+
+    Args:
+        path: 픽스처 경로
+        speed: 지연/간격 배율 (0이면 대기 없음)
+        concurrency: 동시 실행 수 (세션 동시성 재현)
+        pace: True면 기록된 호출 간격(t)을 speed 배율로 재현
+
+    Returns:
+        Dict[str, Any]: 진입점별 지연 백분위수/혼잡·오류 건수와 오퍼레이션별 페이로드/미스 통계
+    """
+    os.environ[TRAFFIC_MODE_ENV] = "replay"
+    os.environ[TRAFFIC_FIXTURE_ENV] = path
+    os.environ[REPLAY_SPEED_ENV] = str(speed)
+
+    # 스크립트 실행 시 __main__과 bedrock_client가 import한 모듈이 달라 저장소를 명시적으로 조회
+    import bedrock_client
+    import bedrock_replay
+
+    records = load_fixture(path)
+    entries = _entry_calls(records)
+    timings: Dict[str, List[float]] = defaultdict(list)
+    outcomes: Dict[str, Dict[str, int]] = defaultdict(lambda: {"busy": 0, "errors": 0})
+    outcomes_lock = threading.Lock()
+    started = time.perf_counter()
+
+    def run(entry):
+        offset, name, kwargs = entry
+        if pace and speed > 0:
+            delay = offset * speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+        t0 = time.perf_counter()
+        if name == "invoke_nova_pro":
+            meta: Dict[str, Any] = {}
+            bedrock_client.invoke_nova_pro(**kwargs, meta=meta)
+        else:
+            _, _, meta = getattr(bedrock_client, name)(**kwargs)
+        timings[name].append((time.perf_counter() - t0) * 1000)
+        # 진입점이 예외 대신 BUSY/오류 결과를 반환하므로 별도 집계 (지연만 보면 정상처럼 보임)
+        if meta.get("busy") or meta.get("error"):
+            with outcomes_lock:
+                outcomes[name]["busy" if meta.get("busy") else "errors"] += 1
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        list(pool.map(run, entries))
+
+    store = bedrock_replay.get_replay_store()
+    return {
+        "entries": {
+            name: {
+                "calls": len(values),
+                "p50_ms": round(_percentile(values, 50), 1),
+                "p95_ms": round(_percentile(values, 95), 1),
+                "max_ms": round(max(values), 1),
+                **outcomes[name],
+            }
+            for name, values in timings.items()
+        },
+        "operations": {op: dict(stats) for op, stats in (store.stats.items() if store else [])},
+        "unused_records": len(records) - sum(int(s.get("calls", 0) - s.get("misses", 0))
+                                             for s in (store.stats.values() if store else [])),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bedrock 트래픽 픽스처 재실행 (성능 회귀 테스트)")
+    parser.add_argument("fixture", help="record 모드로 생성한 픽스처 (.jsonl.gz)")
+    parser.add_argument("--speed", type=float, default=1.0, help="지연 배율 (0이면 대기 없음)")
+    parser.add_argument("--concurrency", type=int, default=1, help="동시 실행 수")
+    parser.add_argument("--pace", action="store_true", help="기록된 호출 간격 재현")
+    parser.add_argument("--max-bytes-growth", type=float, default=0.2,
+                        help="오퍼레이션별 요청 페이로드 허용 증가율 (초과 시 종료코드 1)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(message)s")
+    report = run_replay(args.fixture, speed=args.speed, concurrency=args.concurrency, pace=args.pace)
+    json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write("\n")
+
+    # 회귀 판정: 재생 미스, 요청 페이로드 증가, 미사용 레코드, 진입점 혼잡/오류
+    failed = False
+    if report["unused_records"] > 0:
+        logging.warning(f"[REPLAY] 재생되지 않은 픽스처 레코드 {report['unused_records']}건 (호출 누락)")
+        failed = True
+    for name, stats in report["entries"].items():
+        if stats.get("busy") or stats.get("errors"):
+            logging.warning(f"[REPLAY] {name} 혼잡 {stats['busy']}건 / 오류 {stats['errors']}건")
+            failed = True
+    for op, stats in report["operations"].items():
+        if stats.get("misses"):
+            logging.warning(f"[REPLAY] 픽스처 미스 {int(stats['misses'])}건: {op}")
+            failed = True
+        recorded = stats.get("recorded_req_bytes", 0)
+        if recorded and stats.get("req_bytes", 0) > recorded * (1 + args.max_bytes_growth):
+            logging.warning(f"[REPLAY] 요청 페이로드 증가: {op} {int(recorded)} → {int(stats['req_bytes'])} bytes")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
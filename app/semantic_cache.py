@@ -0,0 +1,419 @@
+# -*- coding: utf-8 -*-
+"""
+semantic_cache.py
+
+질문 임베딩 기반 시맨틱 답변 캐시 (query_kb / invoke_nova_pro 앞단)
+
+주요 기능:
+1. 질문 임베딩 (Titan Text Embeddings V2 또는 로컬 대체 임베더)
+2. NumPy 기반 코사인 유사도 인덱스 검색 (임계값 이상이면 캐시 적중)
+3. 같은 KB 버전/시스템 프롬프트/생성 옵션(scope)으로 생성된 답변만 반환
+4. LRU 방식 용량 관리, 스냅샷 저장/복원, 적중 품질 지표
+
+아키텍처:
+- 프로세스 전역 인스턴스 하나를 모든 Streamlit 세션이 공유 (Lock으로 보호)
+- 벡터는 정규화하여 저장 → 내적 한 번으로 전체 코사인 유사도 계산
+- 임베딩 실패 시 캐시를 우회하여 기존 파이프라인으로 동작 (Graceful Degradation)
+
+설정 (환경변수):
+- SEMANTIC_CACHE_ENABLED: 1이면 활성화 (기본값: 0)
+- SEMANTIC_CACHE_EMBEDDER: titan | local (기본값: titan)
+- SEMANTIC_CACHE_THRESHOLD: 적중 유사도 임계값 (기본값: 0.88)
+- SEMANTIC_CACHE_CAPACITY: 최대 항목 수 (기본값: 2048)
+- SEMANTIC_CACHE_SNAPSHOT: 스냅샷 파일 경로 (.npz, 미설정 시 저장 안 함)
+"""
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from bedrock_client import EMBED_LANE, _scheduled_call, estimate_tokens, get_bedrock_runtime
+
+# =============================================================================
+# 설정 상수
+# =============================================================================
+
+TITAN_EMBED_MODEL_ID = "amazon.titan-embed-text-v2:0"  # Titan Text Embeddings V2 (us-east-1)
+EMBEDDING_DIM = 512                                    # Titan V2 지원 차원: 256 / 512 / 1024
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "0") == "1"
+SEMANTIC_CACHE_EMBEDDER = os.getenv("SEMANTIC_CACHE_EMBEDDER", "titan")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.88"))
+SEMANTIC_CACHE_CAPACITY = int(os.getenv("SEMANTIC_CACHE_CAPACITY", "2048"))
+SEMANTIC_CACHE_SNAPSHOT = os.getenv("SEMANTIC_CACHE_SNAPSHOT", "")
+
+# 임계값 바로 아래(미세 차이로 놓친) 조회를 집계하는 구간 (임계값 튜닝용)
+NEAR_MISS_MARGIN = 0.05
+
+# 스냅샷 자동 저장 주기 (신규 항목 수 기준)
+SNAPSHOT_EVERY = 50
+
+# 캐시 품질 지표 로그 주기 (조회 수 기준, 스냅샷 저장 시에도 기록)
+STATS_LOG_EVERY = int(os.getenv("SEMANTIC_CACHE_STATS_EVERY", "100"))
+
+# 최근 질문 임베딩 메모 크기 (lookup → put 사이 중복 임베딩 방지)
+EMBED_MEMO_SIZE = 64
+
+
+# =============================================================================
+# 임베더
+# =============================================================================
+
+class TitanEmbedder:
+    """
+    Bedrock Titan Text Embeddings V2 임베더
+
+    Note:
+        - Nova Pro와 같은 us-east-1 bedrock-runtime 클라이언트 재사용
+        - 프로세스 전역 스케줄러(EMBED_LANE)를 거쳐 호출 (쿼터 공유, 스로틀링/일시적 오류 재시도)
+        - normalize=True로 요청하여 단위 벡터 반환
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM, model_id: str = TITAN_EMBED_MODEL_ID):
+        self.dim = dim
+        self.model_id = model_id
+
+    def embed(self, text: str) -> np.ndarray:
+        response = _scheduled_call(
+            EMBED_LANE,
+            "semantic_cache",
+            get_bedrock_runtime().invoke_model,
+            tokens=estimate_tokens(text),
+            modelId=self.model_id,
+            contentType="application/json",
+            accept="application/json",
+            body=json.dumps({"inputText": text, "dimensions": self.dim, "normalize": True}),
+        )
+        payload = json.loads(response["body"].read())
+        return np.asarray(payload["embedding"], dtype=np.float32)
+
+
+class HashingEmbedder:
+    """
+    로컬 대체 임베더 (문자 n-gram 해싱, 네트워크 불필요)
+
+    Note:
+        - 테스트/로컬 개발용: 표기가 비슷한 질문끼리만 유사도가 높음
+        - 공백을 제거한 문자 2-gram, 3-gram을 부호 있는 해시 버킷에 누적
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def embed(self, text: str) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        chars = "".join(text.lower().split())
+        for n in (2, 3):
+            for i in range(max(0, len(chars) - n + 1)):
+                digest = hashlib.md5(chars[i:i + n].encode("utf-8")).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                vec[bucket] += 1.0 if digest[4] & 1 else -1.0
+        return vec
+
+
+def make_embedder(kind: str = SEMANTIC_CACHE_EMBEDDER):
+    """설정값에 맞는 임베더 생성 (titan | local)"""
+    if kind == "local":
+        return HashingEmbedder()
+    return TitanEmbedder()
+
+
+def make_scope(kb_id: str, kb_version: str, system_prompt: str, **options: Any) -> str:
+    """
+    캐시 적용 범위 키를 생성합니다.
+
+    Note:
+        - KB ID/버전, 시스템 프롬프트, 생성 옵션이 모두 같을 때만 답변 재사용
+        - KB 재인덱싱 후 버전이 바뀌면 이전 답변은 자연스럽게 LRU로 밀려남
+    """
+    raw = json.dumps(
+        {"kb": kb_id, "ver": kb_version, "sys": system_prompt, "opt": options},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+# =============================================================================
+# 시맨틱 캐시
+# =============================================================================
+
+class CacheHit(NamedTuple):
+    """캐시 적중 결과"""
+    answer: str
+    docs: List[Any]
+    similarity: float
+    question: str
+
+
+class SemanticCache:
+    """
+    NumPy 코사인 유사도 인덱스 기반 답변 캐시
+
+    Note:
+        - 고정 크기 행렬(capacity × dim)에 정규화 벡터 저장, 빈 슬롯 우선 사용
+        - 가득 차면 마지막 사용 시점이 가장 오래된 슬롯을 교체 (LRU)
+        - docs는 JSON 직렬화 가능한 값이어야 함 (스냅샷 저장)
+    """
+
+    def __init__(self, embedder, capacity: int = SEMANTIC_CACHE_CAPACITY,
+                 threshold: float = SEMANTIC_CACHE_THRESHOLD, snapshot_path: str = ""):
+        self.embedder = embedder
+        self.capacity = capacity
+        self.threshold = threshold
+        self.snapshot_path = snapshot_path
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((capacity, embedder.dim), dtype=np.float32)
+        self._valid = np.zeros(capacity, dtype=bool)
+        self._scopes = np.full(capacity, -1, dtype=np.int64)
+        self._last_used = np.zeros(capacity, dtype=np.int64)
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * capacity
+        self._scope_ids: Dict[str, int] = {}
+        self._memo: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._tick = 0
+        self._dirty = 0
+        self.metrics = {
+            "lookups": 0, "hits": 0, "misses": 0, "near_misses": 0,
+            "inserts": 0, "evictions": 0, "embed_errors": 0, "hit_similarity_sum": 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # 내부 유틸리티
+    # ------------------------------------------------------------------
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        """질문 임베딩 (정규화, 최근 질문 메모, 실패 시 None)"""
+        with self._lock:
+            if text in self._memo:
+                self._memo.move_to_end(text)
+                return self._memo[text]
+        try:
+            vec = np.asarray(self.embedder.embed(text), dtype=np.float32)
+        except Exception as e:
+            logging.warning(f"[SEMANTIC_CACHE] 임베딩 실패, 캐시 우회: {e}")
+            with self._lock:
+                self.metrics["embed_errors"] += 1
+            return None
+        norm = float(np.linalg.norm(vec))
+        if norm == 0.0:
+            return None
+        vec = vec / norm
+        with self._lock:
+            self._memo[text] = vec
+            if len(self._memo) > EMBED_MEMO_SIZE:
+                self._memo.popitem(last=False)
+        return vec
+
+    def _scope_id(self, scope: str) -> int:
+        if scope not in self._scope_ids:
+            self._scope_ids[scope] = len(self._scope_ids)
+        return self._scope_ids[scope]
+
+    # ------------------------------------------------------------------
+    # 공개 API
+    # ------------------------------------------------------------------
+
+    def lookup(self, question: str, scope: str) -> Optional[CacheHit]:
+        """
+        의미가 가장 가까운 캐시 답변을 조회합니다.
+
+        Args:
+            question: 사용자 질문
+            scope: make_scope()로 만든 적용 범위 키
+
+        Returns:
+            Optional[CacheHit]: 임계값 이상이면 적중 결과, 아니면 None
+
+        Note:
+            - STATS_LOG_EVERY회 조회마다 품질 지표를 로그로 기록
+        """
+        hit = self._lookup(question, scope)
+        if STATS_LOG_EVERY > 0 and self.metrics["lookups"] % STATS_LOG_EVERY == 0:
+            self.log_stats()
+        return hit
+
+    def _lookup(self, question: str, scope: str) -> Optional[CacheHit]:
+        vec = self._embed(question)
+        with self._lock:
+            self.metrics["lookups"] += 1
+            if vec is None:
+                self.metrics["misses"] += 1
+                return None
+
+            mask = self._valid & (self._scopes == self._scope_ids.get(scope, -2))
+            if not mask.any():
+                self.metrics["misses"] += 1
+                return None
+
+            sims = self._vectors @ vec
+            sims[~mask] = -1.0
+            slot = int(np.argmax(sims))
+            best = float(sims[slot])
+
+            if best < self.threshold:
+                self.metrics["misses"] += 1
+                if best >= self.threshold - NEAR_MISS_MARGIN:
+                    self.metrics["near_misses"] += 1
+                return None
+
+            self._tick += 1
+            self._last_used[slot] = self._tick
+            self.metrics["hits"] += 1
+            self.metrics["hit_similarity_sum"] += best
+            entry = self._entries[slot]
+            return CacheHit(entry["answer"], entry["docs"], best, entry["question"])
+
+    def put(self, question: str, answer: str, docs: List[Any], scope: str) -> None:
+        """
+        생성된 답변을 캐시에 저장합니다.
+
+        Note:
+            - 같은 scope에 거의 동일한 질문(유사도 ≥ 0.999)이 있으면 해당 슬롯 갱신
+            - 스냅샷 경로가 있으면 SNAPSHOT_EVERY건마다 자동 저장
+        """
+        vec = self._embed(question)
+        if vec is None:
+            return
+
+        with self._lock:
+            scope_id = self._scope_id(scope)
+            mask = self._valid & (self._scopes == scope_id)
+            slot = -1
+            if mask.any():
+                sims = self._vectors @ vec
+                sims[~mask] = -1.0
+                candidate = int(np.argmax(sims))
+                if sims[candidate] >= 0.999:
+                    slot = candidate
+            if slot < 0:
+                free = np.flatnonzero(~self._valid)
+                if free.size:
+                    slot = int(free[0])
+                else:
+                    slot = int(np.argmin(self._last_used))
+                    self.metrics["evictions"] += 1
+
+            self._tick += 1
+            self._vectors[slot] = vec
+            self._valid[slot] = True
+            self._scopes[slot] = scope_id
+            self._last_used[slot] = self._tick
+            self._entries[slot] = {
+                "question": question,
+                "answer": answer,
+                "docs": docs,
+                "scope": scope,
+                "created": time.time(),
+            }
+            self.metrics["inserts"] += 1
+            self._dirty += 1
+            should_snapshot = self.snapshot_path and self._dirty >= SNAPSHOT_EVERY
+
+        if should_snapshot:
+            self.save()
+
+    def stats(self) -> Dict[str, Any]:
+        """적중률/평균 적중 유사도 등 캐시 품질 지표"""
+        with self._lock:
+            m = dict(self.metrics)
+            m["size"] = int(self._valid.sum())
+            m["hit_rate"] = m["hits"] / m["lookups"] if m["lookups"] else 0.0
+            m["mean_hit_similarity"] = m["hit_similarity_sum"] / m["hits"] if m["hits"] else 0.0
+            return m
+
+    def log_stats(self) -> None:
+        """품질 지표를 한 줄 로그로 기록 (CloudWatch에서 적중률/임계값 튜닝 근거로 사용)"""
+        m = self.stats()
+        logging.info(
+            f"[SEMANTIC_CACHE] stats size={m['size']} lookups={m['lookups']} hit_rate={m['hit_rate']:.3f} "
+            f"mean_hit_similarity={m['mean_hit_similarity']:.3f} near_misses={m['near_misses']} "
+            f"evictions={m['evictions']} embed_errors={m['embed_errors']}"
+        )
+
+    def save(self, path: Optional[str] = None) -> None:
+        """
+        현재 캐시를 .npz 스냅샷으로 저장합니다 (임시 파일 작성 후 교체).
+        """
+        path = path or self.snapshot_path
+        if not path:
+            return
+        with self._lock:
+            slots = np.flatnonzero(self._valid)
+            order = slots[np.argsort(self._last_used[slots])]  # 오래된 것부터 → 복원 시 LRU 순서 유지
+            vectors = self._vectors[order].copy()
+            entries = json.dumps([self._entries[i] for i in order], ensure_ascii=False)
+            self._dirty = 0
+        tmp = f"{path}.tmp.npz"
+        try:
+            np.savez_compressed(tmp, vectors=vectors, entries=np.array(entries))
+            os.replace(tmp, path)
+            logging.info(f"[SEMANTIC_CACHE] 스냅샷 저장: {path} ({len(order)}건)")
+            self.log_stats()
+        except Exception as e:
+            logging.warning(f"[SEMANTIC_CACHE] 스냅샷 저장 실패: {e}")
+
+    def load(self, path: Optional[str] = None) -> int:
+        """
+        스냅샷을 복원합니다.
+
+        Returns:
+            int: 복원된 항목 수 (파일이 없거나 차원이 다르면 0)
+        """
+        path = path or self.snapshot_path
+        if not path or not os.path.exists(path):
+            return 0
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                vectors = data["vectors"]
+                entries = json.loads(str(data["entries"]))
+        except Exception as e:
+            logging.warning(f"[SEMANTIC_CACHE] 스냅샷 로드 실패: {e}")
+            return 0
+        if vectors.ndim != 2 or vectors.shape[1] != self._vectors.shape[1]:
+            logging.warning(f"[SEMANTIC_CACHE] 스냅샷 차원 불일치: {vectors.shape}")
+            return 0
+
+        # 용량보다 많으면 최근 사용 항목만 유지
+        vectors, entries = vectors[-self.capacity:], entries[-self.capacity:]
+        with self._lock:
+            for slot, (vec, entry) in enumerate(zip(vectors, entries)):
+                self._tick += 1
+                self._vectors[slot] = vec
+                self._valid[slot] = True
+                self._scopes[slot] = self._scope_id(entry["scope"])
+                self._last_used[slot] = self._tick
+                self._entries[slot] = entry
+        logging.info(f"[SEMANTIC_CACHE] 스냅샷 복원: {path} ({len(entries)}건)")
+        return len(entries)
+
+
+def create_semantic_cache() -> Optional[SemanticCache]:
+    """
+    환경변수 설정으로 프로세스 전역 캐시를 생성합니다.
+
+    Returns:
+        Optional[SemanticCache]: 비활성화 시 None
+
+    Note:
+        - 스냅샷 경로가 있으면 시작 시 복원, 프로세스 종료 시 저장
+    """
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
+    cache = SemanticCache(
+        make_embedder(),
+        capacity=SEMANTIC_CACHE_CAPACITY,
+        threshold=SEMANTIC_CACHE_THRESHOLD,
+        snapshot_path=SEMANTIC_CACHE_SNAPSHOT,
+    )
+    if SEMANTIC_CACHE_SNAPSHOT:
+        cache.load()
+        atexit.register(cache.save)
+    return cache
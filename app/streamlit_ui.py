@@ -18,18 +18,26 @@ Streamlit 기반 챗봇 사용자 인터페이스
 """
 
 import os
+import uuid
 import logging
 from pathlib import Path
 import streamlit as st
 
 # bedrock_client 모듈에서 핵심 기능 import
 from bedrock_client import (
+    BUSY_NOTICE,             # 혼잡 시 안내 문구
+    check_input_guardrail,   # 캐시 응답 전 입력 Guardrail 검사
+    DEFAULT_SYSTEM_PROMPT,   # 기본 시스템 프롬프트 (배치 모드와 공유)
+    RetrievedChunk,          # 검색/재정렬 청크 레코드
     compose_prompt,          # 프롬프트 구성
-    get_kb_id_from_ssm,     # KB ID 자동 조회
+    get_kb_ids_from_ssm,    # KB ID 목록 자동 조회
+    get_kb_version_from_ssm,  # KB 버전 조회 (시맨틱 캐시 범위)
     mask_possible_pii,      # PII 마스킹
-    query_kb,               # KB 검색 + Rerank
+    parse_kb_ids,           # KB ID 입력값 파싱
+    query_kbs,              # 다중 KB 검색 + 병합 + Rerank
     invoke_nova_pro,        # Nova Pro 모델 호출
 )
+from semantic_cache import create_semantic_cache, make_scope
 
 # =============================================================================
 # 애플리케이션 설정
@@ -37,19 +45,18 @@ from bedrock_client import (
 
 APP_VERSION = "build-20251118"
 
-# 기본 시스템 프롬프트 (AWS 금융 클라우드 전문가 역할)
-DEFAULT_SYSTEM_PROMPT = (
-    "당신은 AWS 소개 및 제안, 금융분야 클라우드컴퓨팅서비스 전문가입니다. "
-    "질문자의 배경지식이 완벽하지 않을 수 있음을 고려해, 쉬운 용어로 단계적으로 설명하되, "
-    "필요한 경우 구체 예시와 권장 아키텍처, 고 링크(서비스명/프로그램명만)를 제시하세요. "
-    "모호할 때는 필요한 사실을 먼저 확인하는 질문을 1~2개 던진 뒤 답하세요. "
-    "허용된 지식베이스 문서에 근거해 답하며, 추정이 필요할 때는 '추정'임을 명확히 표기하세요."
-)
-
 # UI 아바타 설정
 ASSISTANT_AVATAR = "🤖"  # AI 어시스턴트
 USER_AVATAR = "🧑"       # 사용자
 
+# 대화 기록 렌더링 설정
+# - 최근 N개 메시지만 채팅 버블로 렌더링, 이전 기록은 페이지 단위로 요청 시 표시
+# - 0이면 매 rerun마다 전체 기록을 렌더링 (기존 방식)
+HISTORY_PAGE_SIZE = int(os.getenv("CHAT_HISTORY_PAGE_SIZE", "20"))
+
+# SSM 조회 결과 캐시 유지 시간(초)
+SSM_CACHE_TTL = 300
+
 
 # =============================================================================
 # 유틸리티 함수들
@@ -133,8 +140,111 @@ def safe_unwrap_response(response):
         return f"응답 처리 실패: {e}", False
 
 
+@st.cache_data(ttl=SSM_CACHE_TTL, show_spinner=False)
+def load_default_kb_ids() -> str:
+    """
+    SSM에서 기본 KB ID 목록을 조회합니다 (프로세스 전역 캐시).
+    
+    Returns:
+        str: 쉼표로 구분된 KB ID (사이드바 기본값)
+    
+    Note:
+        - 위젯 조작마다 발생하는 rerun에서 SSM을 반복 호출하지 않도록 캐싱
+        - 모든 세션이 같은 값을 공유하며 TTL 경과 후 재조회
+    """
+    return ", ".join(get_kb_ids_from_ssm())
+
+
+@st.cache_data(ttl=SSM_CACHE_TTL, show_spinner=False)
+def load_kb_version() -> str:
+    """SSM에서 KB 버전을 조회합니다 (프로세스 전역 캐시, 시맨틱 캐시 범위 키에 사용)."""
+    return get_kb_version_from_ssm()
+
+
+@st.cache_resource(show_spinner=False)
+def load_semantic_cache():
+    """
+    프로세스 전역 시맨틱 캐시 (모든 세션 공유)
+    
+    Returns:
+        SemanticCache | None: SEMANTIC_CACHE_ENABLED=1이 아니면 None
+    """
+    return create_semantic_cache()
+
+
+def render_history_page(messages, start: int, end: int) -> str:
+    """
+    이전 대화 구간을 하나의 마크다운 문자열로 변환합니다 (세션 캐시).
+    
+    Args:
+        messages: 세션의 전체 메시지 리스트
+        start: 구간 시작 인덱스 (포함)
+        end: 구간 끝 인덱스 (미포함)
+        
+    Returns:
+        str: 렌더링용 마크다운
+        
+    Note:
+        - 메시지는 추가만 되므로 같은 구간의 결과는 변하지 않음 → 한 번만 생성
+        - 메시지마다 chat_message 컨테이너를 만들지 않아 요소 수와 페이로드 감소
+    """
+    cache = st.session_state.setdefault("history_page_cache", {})
+    key = (start, end)
+    if key not in cache:
+        parts = []
+        for message in messages[start:end]:
+            avatar = USER_AVATAR if message["role"] == "user" else ASSISTANT_AVATAR
+            parts.append(f"{avatar} {message['content']}")
+        cache[key] = "\n\n---\n\n".join(parts)
+    return cache[key]
+
+
+def show_older_history_page():
+    """'이전 대화 보기' 버튼 콜백 (fragment 내부 클릭이므로 대화 영역만 rerun)"""
+    st.session_state.history_pages = st.session_state.get("history_pages", 0) + 1
+
+
+def render_history():
+    """
+    대화 기록을 표시합니다.
+    
+    처리 과정:
+        1. 기록을 HISTORY_PAGE_SIZE 단위의 고정 구간으로 분할
+        2. 마지막 구간(최근 대화)은 채팅 버블로 렌더링
+        3. 이전 구간은 '이전 대화 보기' 요청 시 한 페이지씩 렌더링
+        4. HISTORY_PAGE_SIZE가 0이면 전체 기록을 버블로 렌더링
+        
+    Note:
+        - 구간 경계가 고정되어 있어 이전 페이지의 캐시가 재사용됨
+        - 대화가 길어져도 rerun당 렌더링 요소 수가 일정하게 유지됨
+    """
+    messages = st.session_state.messages
+    page_size = HISTORY_PAGE_SIZE
+    recent_start = 0
+    if page_size > 0 and len(messages) > page_size:
+        recent_start = (len(messages) - page_size) // page_size * page_size
+    
+    if recent_start > 0:
+        # 표시할 이전 페이지 수 (버튼으로 한 페이지씩 확장)
+        pages = min(st.session_state.setdefault("history_pages", 0), recent_start // page_size)
+        for start in range(recent_start - pages * page_size, recent_start, page_size):
+            st.markdown(render_history_page(messages, start, start + page_size), unsafe_allow_html=True)
+        hidden = recent_start - pages * page_size
+        if hidden:
+            st.button(
+                f"⬆️ 이전 대화 보기 ({hidden}건)",
+                key="load_older_history",
+                on_click=show_older_history_page,
+            )
+    
+    for message in messages[recent_start:]:
+        avatar = USER_AVATAR if message["role"] == "user" else ASSISTANT_AVATAR
+        with st.chat_message(message["role"], avatar=avatar):
+            st.markdown(message["content"], unsafe_allow_html=True)
+
+
 def render_reranker_section(reranked, meta):
-    """Reranker 결과 표시"""
+    """Reranker 결과 표시 (RetrievedChunk 리스트)"""
     st.markdown("### 🔎 Reranker 결과")
     st.caption(f"검색 결과: **{meta.get('retrieved', 0)}건**")
     
@@ -148,21 +258,165 @@ def render_reranker_section(reranked, meta):
         st.warning(f"KB 검색 오류: {meta['error']}")
         return
     
+    # 다중 KB 검색 시 KB별 결과 요약
+    per_kb = meta.get("per_kb") or {}
+    if len(per_kb) > 1:
+        st.caption(" • ".join(
+            f"{kb}: {info['error'] or str(info['retrieved']) + '건'}"
+            + (f" ({info['ms']:.0f}ms)" if info.get("ms") is not None else "")
+            for kb, info in per_kb.items()
+        ))
+    
     if reranked and len(reranked) > 0:
         cols = st.columns(min(3, len(reranked)))
-        for i, (doc, score) in enumerate(reranked):
+        for i, chunk in enumerate(reranked):
             with cols[i % len(cols)]:
-                st.caption(f"Top {i+1} • 유사도 {score:.3f}")
-                st.progress(min(max(score, 0.0), 1.0))
+                st.caption(f"Top {i+1} • 유사도 {chunk.score:.3f} • 검색 {chunk.retrieval_score:.3f}")
+                st.progress(min(max(chunk.score, 0.0), 1.0))
                 with st.expander("본문 보기"):
-                    if doc and doc.strip():
-                        st.write(doc)
+                    if chunk.source_uri:
+                        st.caption(f"출처: {chunk.source_uri}")
+                    if chunk.text and chunk.text.strip():
+                        st.write(chunk.text)
                     else:
                         st.write("빈 문서")
     else:
         st.info("관련 문서를 찾지 못했습니다. KB ID/리전, S3 인덱싱, 'KB 검색 결과 수'를 확인하세요.")
 
 
+@st.fragment
+def chat_pane(kb_ids, system_prompt, max_tokens, temperature, top_p, num_kb_docs, show_topcards):
+    """
+    대화 기록 + 입력 + 새 응답 영역 (Streamlit fragment)
+    
+    Note:
+        - 입력창은 대화 영역 아래에 인라인 배치 (fragment 안에서는 하단 고정 불가)
+        - 질문 제출 시 이 영역만 rerun되어 사이드바/헤더/SSM 조회가 다시 실행되지 않음
+        - 사이드바 설정이 바뀌면 전체 rerun으로 새 인자가 전달됨
+    """
+    # 대화 기록 초기화
+    if "messages" not in st.session_state:
+        st.session_state.messages = []
+    
+    # 스케줄러 공정 대기열용 세션 식별자
+    session_id = st.session_state.setdefault("session_id", uuid.uuid4().hex)
+    
+    # 대화 기록 + 새 대화 영역
+    # - fragment 안의 chat_input은 하단에 고정되지 않고 호출 위치에 인라인으로 배치되므로
+    #   영역을 입력창보다 먼저 만들어 새 대화도 입력창 위(기존 기록 아래)에 표시
+    turn_area = st.container()
+    with turn_area:
+        render_history()
+    
+    # 사용자 입력 처리
+    prompt = st.chat_input("")
+    
+    with turn_area:
+        if prompt and not kb_ids:
+            st.warning("Knowledge Base ID가 설정되지 않았습니다. 좌측에서 KB ID를 입력하세요.")
+            return
+    
+        if prompt and kb_ids:
+            # 사용자 메시지 표시
+            with st.chat_message("user", avatar=USER_AVATAR):
+                st.markdown(prompt)
+            st.session_state.messages.append({"role": "user", "content": prompt})
+        
+            final_system = system_prompt.strip() or DEFAULT_SYSTEM_PROMPT
+        
+            # 시맨틱 캐시 조회 (대화 맥락이 없는 첫 질문만 대상)
+            cache = load_semantic_cache() if len(st.session_state.messages) == 1 else None
+            cache_scope = None
+            if cache:
+                cache_scope = make_scope(
+                    ",".join(kb_ids), load_kb_version(), final_system,
+                    max_tokens=max_tokens, temperature=temperature, top_p=top_p, num_docs=num_kb_docs,
+                )
+                hit = cache.lookup(prompt, cache_scope)
+                # 캐시 응답은 converse(Guardrail)를 거치지 않으므로 입력 검사 미통과 시 일반 처리로 전환
+                if hit and not check_input_guardrail(prompt, session_id):
+                    logging.info("[SEMANTIC_CACHE] 입력 Guardrail/PII 검사 미통과 - 캐시 응답 대신 일반 처리")
+                    hit, cache = None, None
+                if hit:
+                    hit_docs = [RetrievedChunk(*item) for item in hit.docs]
+                    logging.info(f"[SEMANTIC_CACHE] 적중 similarity={hit.similarity:.3f} matched={hit.question[:50]!r}")
+                    if show_topcards:
+                        render_reranker_section(hit_docs, {"retrieved": len(hit_docs), "error": None})
+                    with st.chat_message("assistant", avatar=ASSISTANT_AVATAR):
+                        st.markdown(hit.answer)
+                        st.caption(f"⚡ 유사 질문 캐시 응답 (유사도 {hit.similarity:.2f})")
+                    st.session_state.messages.append({"role": "assistant", "content": hit.answer})
+                    return
+        
+            # KB 검색
+            with st.spinner("KB에서 관련 정보를 검색하고 있어요…"):
+                context, reranked, meta = query_kbs(prompt, kb_ids, num_kb_docs, session_id=session_id)
+        
+            # 혼잡으로 거절된 경우 안내만 표시 (대화 기록에는 남기지 않음)
+            if meta.get("busy"):
+                st.session_state.messages.pop()
+                with st.chat_message("assistant", avatar=ASSISTANT_AVATAR):
+                    st.warning(BUSY_NOTICE)
+                st.stop()
+        
+            # 유사도 카드 표시 (옵션)
+            if show_topcards:
+                logging.info(f"[UI_DEBUG] Calling render_reranker_section with {len(reranked) if reranked else 0} items")
+                render_reranker_section(reranked, meta)
+        
+            # KB 미히트 시 차단
+            if meta.get("retrieved", 0) == 0:
+                with st.chat_message("assistant", avatar=ASSISTANT_AVATAR):
+                    st.warning("🔒 KB에서 검색할 수 없어 답변할 수 없습니다.")
+                st.session_state.messages.append({"role": "assistant", "content": "KB 미히트로 차단"})
+                st.stop()
+        
+            # 최종 프롬프트 구성
+            full_prompt = compose_prompt(final_system, context or "", prompt)
+            call_messages = st.session_state.messages + [{"role": "user", "content": full_prompt}]
+        
+            # Bedrock 호출
+            with st.chat_message("assistant", avatar=ASSISTANT_AVATAR):
+                waiting = st.empty()
+                waiting.markdown("⏳ **답변 생성 중…**")
+            
+                nova_meta = {}
+                response = invoke_nova_pro(
+                    call_messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    top_p=top_p,
+                    session_id=session_id,
+                    meta=nova_meta,
+                )
+            
+                reply, gr_blocked = safe_unwrap_response(response)
+                waiting.empty()
+            
+                # 혼잡으로 거절된 경우 검색 단계와 동일하게 안내만 표시 (대화 기록에는 남기지 않음)
+                if nova_meta.get("busy"):
+                    st.session_state.messages.pop()
+                    st.warning(BUSY_NOTICE)
+                    st.stop()
+            
+                reply = mask_possible_pii(reply)
+            
+                # Guardrail 차단 시 세션 초기화
+                if gr_blocked:
+                    st.warning(reply)
+                    st.session_state.clear()
+                    st.stop()
+                else:
+                    st.markdown(reply)
+        
+            # 정상 응답만 세션에 저장
+            st.session_state.messages.append({"role": "assistant", "content": reply})
+        
+            # 정상 생성된 답변만 시맨틱 캐시에 저장
+            if cache and reply != BUSY_NOTICE and not reply.startswith("응답 실패"):
+                cache.put(mask_possible_pii(prompt), reply, [list(item) for item in reranked], cache_scope)
+
+
 def main():
     """메인 UI 함수"""
     # 페이지 설정
@@ -178,8 +432,10 @@ def main():
     
     # 사이드바 설정
     st.sidebar.header("⚙️ 설정")
-    default_kb_id = get_kb_id_from_ssm()
-    kb_id = st.sidebar.text_input("Knowledge Base ID", value=default_kb_id)
+    default_kb_ids = load_default_kb_ids()
+    kb_ids = parse_kb_ids(st.sidebar.text_input(
+        "Knowledge Base ID", value=default_kb_ids, help="여러 KB를 검색하려면 쉼표로 구분해 입력하세요."
+    ))
     
     st.sidebar.subheader("🧠 시스템 프롬프트")
     system_prompt = st.sidebar.text_area(
@@ -209,77 +465,8 @@ def main():
         unsafe_allow_html=True,
     )
     
-    # 대화 기록 초기화
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
-    
-    # 대화 기록 표시
-    for message in st.session_state.messages:
-        avatar = USER_AVATAR if message["role"] == "user" else ASSISTANT_AVATAR
-        with st.chat_message(message["role"], avatar=avatar):
-            st.markdown(message["content"], unsafe_allow_html=True)
-    
-    # 사용자 입력 처리
-    prompt = st.chat_input("")
-    
-    if prompt and not kb_id:
-        st.warning("Knowledge Base ID가 설정되지 않았습니다. 좌측에서 KB ID를 입력하세요.")
-        return
-    
-    if prompt and kb_id:
-        # 사용자 메시지 표시
-        with st.chat_message("user", avatar=USER_AVATAR):
-            st.markdown(prompt)
-        st.session_state.messages.append({"role": "user", "content": prompt})
-        
-        # KB 검색
-        with st.spinner("KB에서 관련 정보를 검색하고 있어요…"):
-            context, reranked, meta = query_kb(prompt, kb_id, num_kb_docs)
-        
-        # 유사도 카드 표시 (옵션)
-        if show_topcards:
-            logging.info(f"[UI_DEBUG] Calling render_reranker_section with {len(reranked) if reranked else 0} items")
-            render_reranker_section(reranked, meta)
-        
-        # KB 미히트 시 차단
-        if meta.get("retrieved", 0) == 0:
-            with st.chat_message("assistant", avatar=ASSISTANT_AVATAR):
-                st.warning("🔒 KB에서 검색할 수 없어 답변할 수 없습니다.")
-            st.session_state.messages.append({"role": "assistant", "content": "KB 미히트로 차단"})
-            st.stop()
-        
-        # 최종 프롬프트 구성
-        final_system = system_prompt.strip() or DEFAULT_SYSTEM_PROMPT
-        full_prompt = compose_prompt(final_system, context or "", prompt)
-        call_messages = st.session_state.messages + [{"role": "user", "content": full_prompt}]
-        
-        # Bedrock 호출
-        with st.chat_message("assistant", avatar=ASSISTANT_AVATAR):
-            waiting = st.empty()
-            waiting.markdown("⏳ **답변 생성 중…**")
-            
-            response = invoke_nova_pro(
-                call_messages,
-                max_tokens=max_tokens,
-                temperature=temperature,
-                top_p=top_p,
-            )
-            
-            reply, gr_blocked = safe_unwrap_response(response)
-            waiting.empty()
-            
-            reply = mask_possible_pii(reply)
-            
-            # Guardrail 차단 시 세션 초기화
-            if gr_blocked:
-                st.warning(reply)
-                st.session_state.clear()
-                st.stop()
-            else:
-                st.markdown(reply)
-        
-        # 정상 응답만 세션에 저장
-        st.session_state.messages.append({"role": "assistant", "content": reply})
+    # 대화 영역 (fragment: 질문 제출 시 이 영역만 rerun)
+    chat_pane(kb_ids, system_prompt, max_tokens, temperature, top_p, num_kb_docs, show_topcards)
     
     # 하단 팁
     st.markdown(
@@ -0,0 +1,577 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+analyze_invocation_logs.py
+
+Stack4에서 활성화한 Bedrock 모델 호출 로그(Model Invocation Logging)를 분석하는 CLI
+
+주요 기능:
+1. 모델별 입력/출력 토큰 및 지연시간(latencyMs) 백분위수 (p50/p90/p99)
+2. 대형 프롬프트 / 느린 호출 Top-K (invoke_nova_pro 지연 원인 추적)
+3. Guardrail 개입 비율
+4. 시간대별(time-of-day) 부하 곡선 및 분당 피크 RPM/TPM (쿼터 산정용)
+
+입력 형식:
+- CloudWatch Logs → S3 내보내기 파일 (*.gz, 각 줄이 "<timestamp> <json>")
+- S3 전달/로컬 저장 JSON Lines 파일 (*.json, *.jsonl, *.log, gzip 여부 무관)
+
+아키텍처:
+- 파일 → 줄 → 레코드 → 호출 요약 순서의 제너레이터 파이프라인 (레코드를 메모리에 적재하지 않음)
+- 백분위수는 로그 스케일 히스토그램, 이상치는 고정 크기 힙으로 집계 → 레코드 수와 무관한 메모리 사용
+- 파일 단위로 ProcessPoolExecutor에 분배 후 요약 결과만 병합 (멀티코어 활용)
+
+사용 예:
+    python scripts/analyze_invocation_logs.py ./exported-logs --workers 8
+    python scripts/analyze_invocation_logs.py a.json.gz b.json.gz --json > report.json
+"""
+
+import argparse
+import gzip
+import heapq
+import json
+import math
+import os
+import re
+import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# =============================================================================
+# 설정 상수
+# =============================================================================
+
+# 분석 대상 파일 확장자 (디렉토리 입력 시 재귀 탐색)
+LOG_FILE_SUFFIXES = (".gz", ".json", ".jsonl", ".log")
+
+# CloudWatch Logs S3 내보내기 줄 접두사 ("2024-11-05T06:22:11.123Z {...}")
+CW_EXPORT_PREFIX = re.compile(r"^\d{4}-\d{2}-\d{2}T\S+\s+(?=\{)")
+
+# 로그 스케일 히스토그램 버킷 증가율 (상대 오차 약 1%)
+HIST_GROWTH = 1.02
+
+# 백분위수 리포트 대상
+PERCENTILES = (50, 90, 99)
+
+# compose_prompt()가 만드는 질문 섹션 헤더 (미리보기에서 실제 질문만 추출)
+QUESTION_MARKER = "[질문]"
+
+
+# =============================================================================
+# 고정 메모리 집계 자료구조
+# =============================================================================
+
+class LogHistogram:
+    """
+    로그 스케일 버킷 히스토그램 (병합 가능한 근사 백분위수)
+
+    Note:
+        - 버킷 수는 값의 범위(최소~최대)에만 비례하고 레코드 수와는 무관
+        - 프로세스별 결과를 merge()로 손실 없이 합칠 수 있음
+    """
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        if value <= 0:
+            self.zeros += 1
+            return
+        idx = int(math.floor(math.log(value, HIST_GROWTH)))
+        self.buckets[idx] = self.buckets.get(idx, 0) + 1
+
+    def merge(self, other: "LogHistogram") -> None:
+        for idx, n in other.buckets.items():
+            self.buckets[idx] = self.buckets.get(idx, 0) + n
+        self.zeros += other.zeros
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q: float) -> float:
+        """q(0~100) 백분위수 근사값 (버킷 상한 기준, 최대값으로 클램프)"""
+        if not self.count:
+            return 0.0
+        rank = max(1, int(math.ceil(self.count * q / 100.0)))
+        if rank <= self.zeros:
+            return 0.0
+        seen = self.zeros
+        for idx in sorted(self.buckets):
+            seen += self.buckets[idx]
+            if seen >= rank:
+                return min(HIST_GROWTH ** (idx + 1), self.max)
+        return self.max
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class TopK:
+    """
+    상위 K개 항목만 유지하는 최소 힙
+
+    Note:
+        - 동점 시 dict 비교를 피하기 위해 삽입 순번을 함께 저장
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self._heap: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._seq = 0  # pickle 가능한 int 카운터 (워커 프로세스에서 반환)
+
+    def push(self, key: float, item: Dict[str, Any]) -> None:
+        if self.k <= 0:
+            return
+        self._seq += 1
+        entry = (key, self._seq, item)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif key > self._heap[0][0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def merge(self, other: "TopK") -> None:
+        for key, _, item in other._heap:
+            self.push(key, item)
+
+    def items(self) -> List[Dict[str, Any]]:
+        return [item for _, _, item in sorted(self._heap, key=lambda e: e[0], reverse=True)]
+
+
+class ModelStats:
+    """모델 단위 집계 (토큰/지연시간 히스토그램, Guardrail 개입 수)"""
+
+    def __init__(self):
+        self.requests = 0
+        self.guardrail_interventions = 0
+        self.input_tokens = LogHistogram()
+        self.output_tokens = LogHistogram()
+        self.latency_ms = LogHistogram()
+
+    def merge(self, other: "ModelStats") -> None:
+        self.requests += other.requests
+        self.guardrail_interventions += other.guardrail_interventions
+        self.input_tokens.merge(other.input_tokens)
+        self.output_tokens.merge(other.output_tokens)
+        self.latency_ms.merge(other.latency_ms)
+
+
+class Summary:
+    """
+    파일 하나(또는 병합된 전체)의 분석 결과
+
+    Note:
+        - 워커 프로세스에서 반환되므로 pickle 가능한 필드만 사용
+        - 분당 카운터는 레코드 수가 아닌 로그 기간(분)에 비례
+    """
+
+    def __init__(self, top_k: int):
+        self.files = 0
+        self.records = 0
+        self.malformed = 0
+        self.skipped = 0
+        self.failed: List[Tuple[str, str]] = []  # (파일 경로, 오류)
+        self.models: Dict[str, ModelStats] = {}
+        self.hourly_requests = [0] * 24
+        self.hourly_tokens = [0] * 24
+        self.per_minute: Dict[Tuple[str, str], List[int]] = {}
+        self.largest_prompts = TopK(top_k)
+        self.slowest_calls = TopK(top_k)
+
+    def merge(self, other: "Summary") -> None:
+        self.files += other.files
+        self.records += other.records
+        self.malformed += other.malformed
+        self.skipped += other.skipped
+        self.failed.extend(other.failed)
+        for model, stats in other.models.items():
+            self.models.setdefault(model, ModelStats()).merge(stats)
+        for hour in range(24):
+            self.hourly_requests[hour] += other.hourly_requests[hour]
+            self.hourly_tokens[hour] += other.hourly_tokens[hour]
+        for key, (reqs, toks) in other.per_minute.items():
+            slot = self.per_minute.setdefault(key, [0, 0])
+            slot[0] += reqs
+            slot[1] += toks
+        self.largest_prompts.merge(other.largest_prompts)
+        self.slowest_calls.merge(other.slowest_calls)
+
+
+# =============================================================================
+# 제너레이터 파이프라인
+# =============================================================================
+
+def iter_log_files(paths: Iterable[str]) -> Iterator[str]:
+    """입력 경로(파일/디렉토리)에서 분석 대상 로그 파일 경로를 순서대로 생성"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    if name.endswith(LOG_FILE_SUFFIXES):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def iter_lines(path: str) -> Iterator[str]:
+    """gzip 여부를 자동 판별하여 파일을 한 줄씩 읽음"""
+    with open(path, "rb") as probe:
+        is_gzip = probe.read(2) == b"\x1f\x8b"
+    opener = gzip.open if is_gzip else open
+    with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
+
+def iter_records(lines: Iterable[str]) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    각 줄을 JSON 레코드로 변환 (파싱 실패 시 None)
+
+    Note:
+        - CloudWatch 내보내기 형식의 타임스탬프 접두사를 제거한 뒤 파싱
+    """
+    for line in lines:
+        match = CW_EXPORT_PREFIX.match(line)
+        if match:
+            line = line[match.end():]
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield None
+            continue
+        yield record if isinstance(record, dict) else None
+
+
+def _prompt_preview(body: Any, limit: int) -> Tuple[str, int]:
+    """
+    입력 본문에서 마지막 user 텍스트를 추출 (미리보기, 전체 글자 수)
+
+    Note:
+        - Converse(messages[].content[].text)와 InvokeModel(inputText/prompt) 모두 지원
+        - compose_prompt() 형식이면 [질문] 섹션만 미리보기로 사용
+    """
+    text = ""
+    if isinstance(body, dict):
+        messages = body.get("messages")
+        if isinstance(messages, list):
+            for msg in reversed(messages):
+                if isinstance(msg, dict) and msg.get("role") == "user":
+                    parts = msg.get("content") or []
+                    if isinstance(parts, list):
+                        text = "\n".join(str(p.get("text") or "") for p in parts if isinstance(p, dict))
+                    elif isinstance(parts, str):
+                        text = parts
+                    break
+        if not text:
+            text = str(body.get("inputText") or body.get("prompt") or "")
+    length = len(text)
+    if limit <= 0:
+        return "", length
+    if QUESTION_MARKER in text:
+        text = text.rsplit(QUESTION_MARKER, 1)[1]
+    text = " ".join(text.split())
+    return (text[:limit] + "…" if len(text) > limit else text), length
+
+
+def _model_name(model_id: str) -> str:
+    """ARN 형식 modelId를 짧은 모델 ID로 정규화"""
+    return model_id.rsplit("/", 1)[-1] if model_id.startswith("arn:") else model_id
+
+
+def _as_number(value: Any, default: Optional[float] = None) -> Optional[float]:
+    """숫자(또는 숫자 문자열)를 float로 변환 (비어 있으면 default, 숫자가 아니면 NaN)"""
+    if value is None or value == "":
+        return default
+    if isinstance(value, bool):
+        return math.nan
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return math.nan
+    return number if math.isfinite(number) and number >= 0 else math.nan
+
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    if not isinstance(value, str):
+        return None
+    try:
+        ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def iter_invocations(records: Iterable[Optional[Dict[str, Any]]], tz: timezone,
+                     preview_chars: int) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    원본 로그 레코드를 분석에 필요한 최소 필드로 축약
+
+    Returns (yield):
+        Dict | None: 호출 요약 또는 None (파싱 실패/필드 타입 오류) / {} (호출 로그가 아닌 레코드)
+
+    Note:
+        - input/output이 객체가 아니거나 토큰 수/지연시간이 숫자가 아니면 None (malformed로 집계)
+    """
+    for rec in records:
+        if rec is None:
+            yield None
+            continue
+        if rec.get("schemaType", "ModelInvocationLog") != "ModelInvocationLog" or not rec.get("modelId"):
+            yield {}
+            continue
+
+        inp = rec.get("input") or {}
+        out = rec.get("output") or {}
+        if not isinstance(inp, dict) or not isinstance(out, dict):
+            yield None
+            continue
+        out_body = out.get("outputBodyJson") if isinstance(out.get("outputBodyJson"), dict) else {}
+        metrics = out_body.get("metrics") if isinstance(out_body.get("metrics"), dict) else {}
+        stop_reason = str(out_body.get("stopReason") or "")
+        preview, prompt_chars = _prompt_preview(inp.get("inputBodyJson"), preview_chars)
+        ts = _parse_timestamp(rec.get("timestamp"))
+        input_tokens = _as_number(inp.get("inputTokenCount"), 0.0)
+        output_tokens = _as_number(out.get("outputTokenCount"), 0.0)
+        latency_ms = _as_number(metrics.get("latencyMs"))
+        if math.isnan(input_tokens) or math.isnan(output_tokens) or (latency_ms is not None and math.isnan(latency_ms)):
+            yield None
+            continue
+
+        yield {
+            "request_id": rec.get("requestId", ""),
+            "model": _model_name(str(rec["modelId"])),
+            "operation": rec.get("operation", ""),
+            "time": ts.astimezone(tz) if ts else None,
+            "input_tokens": int(input_tokens),
+            "output_tokens": int(output_tokens),
+            "latency_ms": latency_ms,
+            "guardrail": (
+                stop_reason == "guardrail_intervened"
+                or out_body.get("amazon-bedrock-guardrailAction") == "INTERVENED"
+            ),
+            "prompt_chars": prompt_chars,
+            "preview": preview,
+        }
+
+
+def summarize_file(path: str, tz_offset: float, top_k: int, preview_chars: int) -> Summary:
+    """
+    단일 파일을 스트리밍으로 집계 (워커 프로세스 진입점)
+
+    Args:
+        path: 로그 파일 경로
+        tz_offset: 시간대별 집계 기준 UTC 오프셋(시간)
+        top_k: 이상치 Top-K 크기
+        preview_chars: 프롬프트 미리보기 글자 수 (0이면 생략)
+
+    Note:
+        - 파일 없음/손상된 gzip 등 읽기 오류는 failed에 기록 (전체 실행은 계속)
+        - 잘린 파일은 오류 지점까지 읽은 레코드를 집계에 포함
+    """
+    summary = Summary(top_k)
+    summary.files = 1
+    try:
+        _summarize_into(summary, path, tz_offset, preview_chars)
+    except (OSError, EOFError, zlib.error) as e:
+        summary.failed.append((path, f"{type(e).__name__}: {e}"))
+    return summary
+
+
+def _summarize_into(summary: Summary, path: str, tz_offset: float, preview_chars: int) -> None:
+    tz = timezone(timedelta(hours=tz_offset))
+    pipeline = iter_invocations(iter_records(iter_lines(path)), tz, preview_chars)
+    for inv in pipeline:
+        if inv is None:
+            summary.malformed += 1
+            continue
+        if not inv:
+            summary.skipped += 1
+            continue
+
+        summary.records += 1
+        stats = summary.models.setdefault(inv["model"], ModelStats())
+        stats.requests += 1
+        stats.input_tokens.add(inv["input_tokens"])
+        stats.output_tokens.add(inv["output_tokens"])
+        if inv["latency_ms"] is not None:
+            stats.latency_ms.add(float(inv["latency_ms"]))
+        if inv["guardrail"]:
+            stats.guardrail_interventions += 1
+
+        tokens = inv["input_tokens"] + inv["output_tokens"]
+        if inv["time"] is not None:
+            hour = inv["time"].hour
+            summary.hourly_requests[hour] += 1
+            summary.hourly_tokens[hour] += tokens
+            minute = inv["time"].strftime("%Y-%m-%dT%H:%M")
+            slot = summary.per_minute.setdefault((inv["model"], minute), [0, 0])
+            slot[0] += 1
+            slot[1] += tokens
+
+        outlier = {
+            "request_id": inv["request_id"],
+            "model": inv["model"],
+            "time": inv["time"].isoformat() if inv["time"] else None,
+            "input_tokens": inv["input_tokens"],
+            "output_tokens": inv["output_tokens"],
+            "latency_ms": inv["latency_ms"],
+            "prompt_chars": inv["prompt_chars"],
+            "preview": inv["preview"],
+        }
+        summary.largest_prompts.push(inv["input_tokens"], outlier)
+        if inv["latency_ms"] is not None:
+            summary.slowest_calls.push(float(inv["latency_ms"]), outlier)
+
+
+def analyze(paths: Iterable[str], *, workers: int, tz_offset: float, top_k: int,
+            preview_chars: int) -> Summary:
+    """
+    모든 입력 파일을 병렬 집계 후 병합
+
+    Note:
+        - workers <= 1이면 현재 프로세스에서 순차 처리 (디버깅용)
+        - 완료된 파일부터 즉시 병합하여 워커 결과를 오래 보관하지 않음
+    """
+    total = Summary(top_k)
+    files = iter_log_files(paths)
+
+    if workers <= 1:
+        for path in files:
+            total.merge(summarize_file(path, tz_offset, top_k, preview_chars))
+        return total
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for path in files:
+            pending.add(pool.submit(summarize_file, path, tz_offset, top_k, preview_chars))
+            # 제출 대기열도 워커 수의 배수로 제한
+            if len(pending) >= workers * 4:
+                done = next(as_completed(pending))
+                pending.remove(done)
+                total.merge(done.result())
+        for fut in as_completed(pending):
+            total.merge(fut.result())
+    return total
+
+
+# =============================================================================
+# 리포트 출력
+# =============================================================================
+
+def build_report(summary: Summary) -> Dict[str, Any]:
+    """집계 결과를 JSON 직렬화 가능한 리포트로 변환"""
+    peaks: Dict[str, Dict[str, Any]] = {}
+    for (model, minute), (reqs, toks) in summary.per_minute.items():
+        peak = peaks.setdefault(model, {"rpm": 0, "rpm_at": None, "tpm": 0, "tpm_at": None})
+        if reqs > peak["rpm"]:
+            peak["rpm"], peak["rpm_at"] = reqs, minute
+        if toks > peak["tpm"]:
+            peak["tpm"], peak["tpm_at"] = toks, minute
+
+    models = {}
+    for model, stats in sorted(summary.models.items(), key=lambda kv: -kv[1].requests):
+        models[model] = {
+            "requests": stats.requests,
+            "guardrail_interventions": stats.guardrail_interventions,
+            "guardrail_rate": stats.guardrail_interventions / stats.requests if stats.requests else 0.0,
+            "input_tokens": _hist_report(stats.input_tokens),
+            "output_tokens": _hist_report(stats.output_tokens),
+            "latency_ms": _hist_report(stats.latency_ms),
+            "peak": peaks.get(model, {}),
+        }
+
+    return {
+        "files": summary.files,
+        "records": summary.records,
+        "malformed": summary.malformed,
+        "skipped": summary.skipped,
+        "failed_files": [{"path": path, "error": error} for path, error in summary.failed],
+        "models": models,
+        "hourly": [
+            {"hour": h, "requests": summary.hourly_requests[h], "tokens": summary.hourly_tokens[h]}
+            for h in range(24)
+        ],
+        "largest_prompts": summary.largest_prompts.items(),
+        "slowest_calls": summary.slowest_calls.items(),
+    }
+
+
+def _hist_report(hist: LogHistogram) -> Dict[str, float]:
+    report = {"count": hist.count, "mean": round(hist.mean(), 1), "max": hist.max}
+    for q in PERCENTILES:
+        report[f"p{q}"] = round(hist.percentile(q), 1)
+    return report
+
+
+def print_report(report: Dict[str, Any], out=sys.stdout) -> None:
+    """사람이 읽기 쉬운 텍스트 리포트 출력"""
+    w = out.write
+    w(f"파일 {report['files']}개 • 호출 {report['records']}건 "
+      f"• 파싱 실패 {report['malformed']}건 • 기타 레코드 {report['skipped']}건\n")
+    for failed in report["failed_files"]:
+        w(f"  ! 읽기 실패: {failed['path']} ({failed['error']})\n")
+    w("\n")
+
+    w("## 모델별 통계\n")
+    for model, m in report["models"].items():
+        w(f"- {model}: {m['requests']}건, Guardrail 개입 {m['guardrail_interventions']}건 "
+          f"({m['guardrail_rate']:.1%})\n")
+        for label, key in (("입력 토큰", "input_tokens"), ("출력 토큰", "output_tokens"), ("지연(ms)", "latency_ms")):
+            h = m[key]
+            w(f"    {label:<8} p50={h['p50']:<10} p90={h['p90']:<10} p99={h['p99']:<10} max={h['max']}\n")
+        if m["peak"]:
+            p = m["peak"]
+            w(f"    피크 RPM={p['rpm']} ({p['rpm_at']}) • 피크 TPM={p['tpm']} ({p['tpm_at']})\n")
+
+    w("\n## 시간대별 부하\n")
+    peak_reqs = max((h["requests"] for h in report["hourly"]), default=0) or 1
+    for h in report["hourly"]:
+        bar = "█" * int(round(40 * h["requests"] / peak_reqs))
+        w(f"  {h['hour']:02d}시 {h['requests']:>8}건 {h['tokens']:>12} tok {bar}\n")
+
+    for title, key in (("대형 프롬프트 Top", "largest_prompts"), ("느린 호출 Top", "slowest_calls")):
+        w(f"\n## {title}\n")
+        for item in report[key]:
+            w(f"- {item['time']} {item['model']} in={item['input_tokens']} out={item['output_tokens']} "
+              f"latency={item['latency_ms']}ms req={item['request_id']}\n")
+            if item["preview"]:
+                w(f"    {item['preview']}\n")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bedrock 모델 호출 로그 스트리밍 분석기")
+    parser.add_argument("paths", nargs="+", help="로그 파일 또는 디렉토리 (gzip 자동 인식)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="병렬 워커 프로세스 수")
+    parser.add_argument("--tz-offset", type=float, default=9.0, help="시간대별 집계 UTC 오프셋 (기본: KST +9)")
+    parser.add_argument("--top", type=int, default=10, help="이상치 Top-K 개수")
+    parser.add_argument("--preview-chars", type=int, default=120, help="프롬프트 미리보기 글자 수 (0이면 생략)")
+    parser.add_argument("--json", action="store_true", help="JSON 리포트 출력")
+    args = parser.parse_args(argv)
+
+    summary = analyze(
+        args.paths,
+        workers=args.workers,
+        tz_offset=args.tz_offset,
+        top_k=args.top,
+        preview_chars=args.preview_chars,
+    )
+    report = build_report(summary)
+    if args.json:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+    else:
+        print_report(report)
+    return 1 if report["failed_files"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
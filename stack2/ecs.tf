@@ -20,7 +20,9 @@ data "aws_cloudwatch_log_group" "app" {
 
 # SSM 파라미터 ARN (/chatbot/bedrock/kb_id: ap-northeast-2)
 locals {
-  kb_id_param_arn = "arn:aws:ssm:${data.aws_region.current.id}:${data.aws_caller_identity.current.account_id}:parameter${var.kb_id_ssm_parameter_name}"
+  kb_id_param_arn      = "arn:aws:ssm:${data.aws_region.current.id}:${data.aws_caller_identity.current.account_id}:parameter${var.kb_id_ssm_parameter_name}"
+  kb_ids_param_arn     = "arn:aws:ssm:${data.aws_region.current.id}:${data.aws_caller_identity.current.account_id}:parameter${var.kb_ids_ssm_parameter_name}"
+  kb_version_param_arn = "arn:aws:ssm:${data.aws_region.current.id}:${data.aws_caller_identity.current.account_id}:parameter${var.kb_version_ssm_parameter_name}"
 }
 
 # us-east-1 Guardrail Param ARN
@@ -44,6 +46,8 @@ resource "aws_iam_policy" "task_ssm_read" {
         ],
         Resource = [
           local.kb_id_param_arn,
+          local.kb_ids_param_arn,
+          local.kb_version_param_arn,
           local.guardrail_param_prefix_arn
         ]
       }
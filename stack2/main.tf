@@ -50,3 +50,30 @@ resource "aws_ssm_parameter" "kb_id_param" {
     Name = "bedrock-kb-id"
   }
 }
+
+# 검색 대상 KB ID 목록 - 앱이 여러 KB를 병렬 검색 (이 스택의 KB + 추가 KB)
+resource "aws_ssm_parameter" "kb_ids_param" {
+  name  = var.kb_ids_ssm_parameter_name
+  type  = "StringList"
+  value = join(",", distinct(concat([module.bedrock_kb.knowledge_base_id], var.additional_kb_ids)))
+
+  tags = {
+    Name = "bedrock-kb-ids"
+  }
+}
+
+# KB 버전(인덱싱 세대) - 앱의 시맨틱 캐시 범위 키로 사용
+# 값은 데이터 동기화 후 운영 절차에서 갱신하므로 Terraform은 초기값만 생성
+resource "aws_ssm_parameter" "kb_version_param" {
+  name  = var.kb_version_ssm_parameter_name
+  type  = "String"
+  value = "1"
+
+  lifecycle {
+    ignore_changes = [value]
+  }
+
+  tags = {
+    Name = "bedrock-kb-version"
+  }
+}
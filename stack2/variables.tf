@@ -74,6 +74,24 @@ variable "kb_id_ssm_parameter_name" {
   type        = string
 }
 
+variable "kb_ids_ssm_parameter_name" {
+  description = "검색 대상 KB ID 목록(StringList)을 저장할 Systems Manager Parameter 이름"
+  type        = string
+  default     = "/chatbot/bedrock/kb_ids"
+}
+
+variable "additional_kb_ids" {
+  description = "함께 검색할 추가 Knowledge Base ID 목록 (예: 규정, AWS 서비스 문서, 내부 FAQ KB)"
+  type        = list(string)
+  default     = []
+}
+
+variable "kb_version_ssm_parameter_name" {
+  description = "KB 버전(인덱싱 세대)을 저장할 Systems Manager Parameter 이름 (시맨틱 캐시 무효화용)"
+  type        = string
+  default     = "/chatbot/bedrock/kb_version"
+}
+
 # us-east-1
 variable "guardrail_ssm_prefix" {
   description = "Guardrail SSM 파라미터 프리픽스(us-east-1). 예: /chatbot/guardrail"